@@ -0,0 +1,232 @@
+import time
+
+import aiomysql
+
+from mysql_helper import count_sql, delete_sql, insert_sql, select_sql, update_sql
+from query_instrumentation import QueryEvent, console_hook, emit
+from student_records import column_names
+
+
+class AsyncStreamingResult:
+
+    def __init__(self, pool, sql, params=None, batch_size=None, hooks=()):
+        self.columns = ()
+        self.batch_size = batch_size
+        self.count = 0
+        self._pool = pool
+        self._sql = sql
+        self._params = params
+        self._conn = None
+        self._cursor = None
+        self._exhausted = False
+        self._hooks = hooks
+        self._started = None
+
+    async def __aenter__(self):
+        self._started = time.perf_counter()
+        try:
+            self._conn = await self._pool.acquire()
+            self._cursor = await self._conn.cursor(aiomysql.SSCursor)
+            if self._params:
+                await self._cursor.execute(self._sql, self._params)
+            else:
+                await self._cursor.execute(self._sql)
+            self.columns = column_names(self._cursor.description)
+        except Exception as e:
+            await self.close(e)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def __aiter__(self):
+        while self._cursor is not None:
+            rows = await self._cursor.fetchmany(self.batch_size or 1000)
+            if not rows:
+                self._exhausted = True
+                break
+            self.count += len(rows)
+            if self.batch_size:
+                yield rows
+            else:
+                for row in rows:
+                    yield row
+
+    async def close(self, error=None):
+        conn, self._conn = self._conn, None
+        cursor, self._cursor = self._cursor, None
+        if conn is None and error is None:
+            return
+
+        if conn is not None:
+            if cursor is not None and self._exhausted:
+                await cursor.close()
+            else:
+                # 提前停止时直接关闭连接，避免读完整个结果集，连接池会丢弃已关闭的连接
+                conn.close()
+            self._pool.release(conn)
+
+        if self._hooks:
+            emit(self._hooks, QueryEvent('stream', self._sql, self._params,
+                                         time.perf_counter() - self._started,
+                                         rows=self.count, error=error))
+
+
+class AsyncMySQLHelper:
+
+    def __init__(self, host='localhost', user='root', password='', database='', port=3306,
+                 min_size=1, max_size=10, max_lifetime=3600, hooks=None):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+        self.port = port
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.pool = None
+        self.hooks = [console_hook] if hooks is None else list(hooks)
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def _emit(self, operation, sql=None, params=None, started=None, **fields):
+        if self.hooks:
+            elapsed = time.perf_counter() - started if started is not None else 0.0
+            emit(self.hooks, QueryEvent(operation, sql, params, elapsed, **fields))
+
+    async def connect(self):
+        try:
+            # aiomysql 的连接池会关闭带着未结束事务归还的连接，所以使用自动提交，
+            # 需要多条语句一起提交时显式 begin()
+            self.pool = await aiomysql.create_pool(
+                host=self.host,
+                port=self.port,
+                user=self.user,
+                password=self.password,
+                db=self.database,
+                minsize=self.min_size,
+                maxsize=self.max_size,
+                pool_recycle=self.max_lifetime,
+                charset='utf8mb4',
+                autocommit=True
+            )
+            self._emit('connect')
+            return True
+        except Exception as e:
+            self._emit('connect', error=e)
+            return False
+
+    async def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+        self._emit('close')
+
+    async def run_sql(self, sql, params=None):
+        started = time.perf_counter()
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    if params:
+                        await cursor.execute(sql, params)
+                    else:
+                        await cursor.execute(sql)
+                    affected = cursor.rowcount
+
+            self._emit('execute', sql, params, started, rows=affected)
+            return affected
+
+        except Exception as e:
+            self._emit('execute', sql, params, started, error=e)
+            return 0
+
+    async def get_data(self, sql, params=None):
+        started = time.perf_counter()
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    if params:
+                        await cursor.execute(sql, params)
+                    else:
+                        await cursor.execute(sql)
+
+                    results = await cursor.fetchall()
+                    columns = column_names(cursor.description)
+
+            self._emit('query', sql, params, started, rows=len(results), data=results)
+            return {
+                'columns': columns,
+                'data': results,
+                'count': len(results)
+            }
+
+        except Exception as e:
+            self._emit('query', sql, params, started, error=e)
+            return {'columns': [], 'data': [], 'count': 0}
+
+    def stream_data(self, sql, params=None, batch_size=None):
+        return AsyncStreamingResult(self.pool, sql, params, batch_size, self.hooks)
+
+    async def insert(self, table, data):
+        return await self.run_sql(insert_sql(table, tuple(data)), tuple(data.values()))
+
+    async def insert_many(self, table, rows, chunk_size=1000):
+        rows = list(rows)
+        if not rows:
+            return {'affected': 0, 'chunks': []}
+
+        columns = tuple(rows[0])
+        sql = insert_sql(table, columns)
+        chunks = []
+        started = time.perf_counter()
+
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.begin()
+                try:
+                    async with conn.cursor() as cursor:
+                        for i in range(0, len(rows), chunk_size):
+                            chunk = rows[i:i + chunk_size]
+                            await cursor.executemany(sql, [tuple(row[c] for c in columns) for row in chunk])
+                            chunks.append(cursor.rowcount)
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+
+            affected = sum(chunks)
+            self._emit('insert_many', sql, None, started, rows=affected, batches=len(chunks))
+            return {'affected': affected, 'chunks': chunks}
+
+        except Exception as e:
+            self._emit('insert_many', sql, None, started, error=e)
+            return {'affected': 0, 'chunks': []}
+
+    async def select(self, table, where=None, params=None, order_by=None):
+        return await self.get_data(select_sql(table, where, order_by), params)
+
+    def select_stream(self, table, where=None, params=None, order_by=None, batch_size=None):
+        return self.stream_data(select_sql(table, where, order_by), params, batch_size)
+
+    async def update(self, table, data, where, where_params=None):
+        params = tuple(data.values())
+        if where_params:
+            params += tuple(where_params)
+        return await self.run_sql(update_sql(table, tuple(data), where), params)
+
+    async def delete(self, table, where, params=None):
+        return await self.run_sql(delete_sql(table, where), params)
+
+    async def get_one(self, table, where, params=None):
+        result = await self.select(table, where, params)
+        if result['data']:
+            return result['data'][0]
+        return None
+
+    async def count(self, table, where=None, params=None):
+        result = await self.get_data(count_sql(table, where), params)
+        if result['data']:
+            return result['data'][0][0]
+        return 0
@@ -0,0 +1,230 @@
+import argparse
+import json
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from db_config import load_config
+from mysql_helper import MySQLHelper
+from mysql_pool import ConnectionPool
+from query_instrumentation import QueryMetrics
+from student_schema import migrate
+
+
+ALL_OPERATIONS = ['insert', 'insert_many', 'select', 'get_one', 'update', 'count', 'delete']
+
+
+def max_rss_kb():
+    # 整个进程的内存峰值，只能作为整次压测的结果，不能归到某一个操作上
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上单位是字节，Linux 上是 KB
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+def latency_summary(latencies):
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    return {
+        'p50': pick(50),
+        'p95': pick(95),
+        'p99': pick(99),
+        'max': ordered[-1] * 1000,
+        'mean': sum(ordered) / len(ordered) * 1000
+    }
+
+
+def random_student(i):
+    return {'name': f'压测学生{i}', 'height': round(random.uniform(140, 200), 2)}
+
+
+class Benchmark:
+    """非交互式压测：按配置的数据量和并发度驱动 MySQLHelper 的各个 CRUD 路径"""
+
+    def __init__(self, host='localhost', user='root', password='', database='school_db',
+                 table='bench_students', rows=1000, iterations=1000, batch_size=1000):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+        self.table = table
+        self.rows = rows
+        self.iterations = iterations
+        self.batch_size = batch_size
+        self.pool = None
+        self.max_id = 0
+
+    def helper(self, metrics=None):
+        return MySQLHelper(self.host, self.user, self.password, self.database,
+                           pool=self.pool, hooks=[metrics] if metrics else [])
+
+    def prepare(self, concurrency):
+        if self.pool is not None:
+            self.pool.close()
+        self.pool = ConnectionPool(self.host, self.user, self.password, self.database,
+                                   min_size=1, max_size=max(concurrency, 1))
+        db = self.helper()
+        if not db.connect():
+            raise Exception("无法连接数据库")
+        db.run_sql(f"DROP TABLE IF EXISTS {self.table}", raise_errors=True)
+        if not migrate(db, self.table):
+            raise Exception("创建压测表失败")
+
+    def load(self, db):
+        rows = (random_student(i) for i in range(self.rows))
+        db.insert_many(self.table, rows, chunk_size=self.batch_size)
+        self.refresh_max_id(db)
+
+    def refresh_max_id(self, db):
+        result = db.get_data(f"SELECT MAX(student_id) FROM {self.table}")
+        self.max_id = 0
+        if result['data'] and result['data'][0][0]:
+            self.max_id = result['data'][0][0]
+
+    def random_id(self):
+        return random.randint(1, max(self.max_id, 1))
+
+    def operation_calls(self, operation):
+        # 返回 (调用次数, 处理的总行数, 单次调用函数)
+        table = self.table
+        if operation == 'insert':
+            return self.rows, self.rows, lambda db, i: db.insert(table, random_student(i))
+        if operation == 'insert_many':
+            # 最后一批只写剩下的行，总行数与 --rows 一致
+            calls = -(-self.rows // self.batch_size)
+            return calls, self.rows, lambda db, i: db.insert_many(
+                table, [random_student(j) for j in range(i * self.batch_size,
+                                                         min((i + 1) * self.batch_size, self.rows))],
+                chunk_size=self.batch_size)
+        if operation == 'select':
+            def select(db, i):
+                low = random.uniform(140, 195)
+                db.select(table, 'height BETWEEN %s AND %s', (low, low + 1))
+            return self.iterations, self.iterations, select
+        if operation == 'get_one':
+            return self.iterations, self.iterations, lambda db, i: db.get_one(
+                table, 'student_id = %s', (self.random_id(),))
+        if operation == 'update':
+            return self.iterations, self.iterations, lambda db, i: db.update(
+                table, {'height': round(random.uniform(140, 200), 2)},
+                'student_id = %s', (self.random_id(),))
+        if operation == 'count':
+            return self.iterations, self.iterations, lambda db, i: db.count(
+                table, 'height > %s', (random.uniform(140, 200),))
+        if operation == 'delete':
+            calls = min(self.iterations, self.max_id)
+            return calls, calls, lambda db, i: db.delete(table, 'student_id = %s', (i + 1,))
+        raise ValueError(f"未知的压测操作: {operation}")
+
+    def run_operation(self, operation, concurrency):
+        calls, rows, func = self.operation_calls(operation)
+        metrics = QueryMetrics(slow_threshold=None)
+        helpers = [self.helper(metrics) for _ in range(concurrency)]
+
+        def worker(index):
+            db = helpers[index]
+            latencies = []
+            for i in range(index, calls, concurrency):
+                started = time.perf_counter()
+                func(db, i)
+                latencies.append(time.perf_counter() - started)
+            return latencies
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(worker, range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        latencies = [value for result in results for value in result]
+        return {
+            'operation': operation,
+            'concurrency': concurrency,
+            'calls': calls,
+            'rows': rows,
+            'seconds': elapsed,
+            'ops_per_second': calls / elapsed if elapsed else None,
+            'rows_per_second': rows / elapsed if elapsed else None,
+            'latency_ms': latency_summary(latencies),
+            'errors': metrics.errors
+        }
+
+    def run(self, operations=None, concurrency_levels=(1,)):
+        operations = operations or ALL_OPERATIONS
+        results = []
+        for concurrency in concurrency_levels:
+            self.prepare(concurrency)
+            db = self.helper()
+            # 读、改、删操作需要先有数据
+            if not any(op in operations for op in ('insert', 'insert_many')):
+                self.load(db)
+
+            for operation in operations:
+                results.append(self.run_operation(operation, concurrency))
+                if operation in ('insert', 'insert_many'):
+                    self.refresh_max_id(db)
+
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+        return {
+            'config': {
+                'host': self.host,
+                'database': self.database,
+                'table': self.table,
+                'rows': self.rows,
+                'iterations': self.iterations,
+                'batch_size': self.batch_size,
+                'operations': operations,
+                'concurrency': list(concurrency_levels)
+            },
+            'results': results,
+            'max_rss_kb': max_rss_kb()
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MySQLHelper CRUD 压测")
+    # 连接信息与 student_cli 一样由 load_config 合并默认值、配置文件、环境变量和命令行参数
+    parser.add_argument('--config', help="INI 配置文件，连接信息写在 [mysql] 段")
+    parser.add_argument('--host')
+    parser.add_argument('--user')
+    parser.add_argument('--password')
+    parser.add_argument('--database')
+    parser.add_argument('--table', default='bench_students')
+    parser.add_argument('--rows', type=int, default=1000, help="写入的行数")
+    parser.add_argument('--iterations', type=int, default=1000, help="读、改、删的调用次数")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1])
+    parser.add_argument('--ops', nargs='+', choices=ALL_OPERATIONS, default=ALL_OPERATIONS)
+    parser.add_argument('--output', help="把 JSON 结果写入文件")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config, host=args.host, user=args.user, password=args.password,
+                         database=args.database)
+    benchmark = Benchmark(config['host'], config['user'], config['password'], config['database'],
+                          args.table, args.rows, args.iterations, args.batch_size)
+    report = benchmark.run(args.ops, args.concurrency)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+from array import array
+
+from pymysql.constants import FIELD_TYPE
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+INTEGER_FIELDS = {FIELD_TYPE.TINY, FIELD_TYPE.SHORT, FIELD_TYPE.LONG, FIELD_TYPE.LONGLONG,
+                  FIELD_TYPE.INT24, FIELD_TYPE.YEAR}
+FLOAT_FIELDS = {FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL, FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE}
+
+# 按列名指定的类型优先于按字段类型推断
+DEFAULT_COLUMN_TYPES = {'student_id': 'int64', 'height': 'float64'}
+
+_TYPECODES = {'int64': 'q', 'float64': 'd'}
+
+
+def column_types(description, types=None):
+    """为每一列选出 'int64'、'float64' 或 None（其他列保持 Python 列表）"""
+    result = []
+    for desc in description or ():
+        name = desc[0]
+        if types and name in types:
+            result.append(types[name])
+        elif name in DEFAULT_COLUMN_TYPES:
+            result.append(DEFAULT_COLUMN_TYPES[name])
+        elif desc[1] in INTEGER_FIELDS:
+            result.append('int64')
+        elif desc[1] in FLOAT_FIELDS:
+            result.append('float64')
+        else:
+            result.append(None)
+    return result
+
+
+def _to_float(value):
+    return float('nan') if value is None else float(value)
+
+
+class ColumnBuilder:
+    """逐批追加一列的值，最后得到 NumPy 数组、array.array 或列表
+
+    浮点列中的 NULL 变成 NaN，整数列不能含有 NULL。
+    """
+
+    def __init__(self, dtype=None):
+        self.dtype = dtype
+        if dtype is None or numpy is not None:
+            self._values = []
+        else:
+            self._values = array(_TYPECODES[dtype])
+
+    def extend(self, values):
+        if self.dtype is None:
+            self._values.extend(values)
+        elif numpy is not None:
+            # 每批先转成数组，结束时一次拼接
+            self._values.append(numpy.array(values, dtype=self.dtype))
+        elif self.dtype == 'float64':
+            self._values.extend(map(_to_float, values))
+        else:
+            self._values.extend(map(int, values))
+
+    def finish(self):
+        if self.dtype is not None and numpy is not None:
+            if not self._values:
+                return numpy.empty(0, dtype=self.dtype)
+            return numpy.concatenate(self._values)
+        return self._values
@@ -0,0 +1,57 @@
+import configparser
+import os
+
+
+# 源码中不保存密码，通过配置文件或 MYSQL_PASSWORD 提供
+DEFAULT_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '',
+    'database': 'school_db'
+}
+
+ENV_VARS = {
+    'host': 'MYSQL_HOST',
+    'user': 'MYSQL_USER',
+    'password': 'MYSQL_PASSWORD',
+    'database': 'MYSQL_DATABASE'
+}
+
+# 只读副本列表，逗号分隔的 host[:port]
+REPLICAS_ENV = 'MYSQL_REPLICAS'
+
+CONFIG_ENV = 'SCHOOL_DB_CONFIG'
+DEFAULT_CONFIG_FILE = 'school_db.ini'
+
+
+def load_config(path=None, **overrides):
+    """按 默认值 < 配置文件 < 环境变量 < 参数 的顺序合并数据库连接配置
+
+    配置文件是 INI 格式，连接信息写在 [mysql] 段中；未指定路径时依次尝试
+    SCHOOL_DB_CONFIG 环境变量和当前目录下的 school_db.ini。配置了 replicas 时
+    结果中多一个副本地址列表。
+    """
+    config = dict(DEFAULT_CONFIG)
+    replicas = None
+
+    path = path or os.environ.get(CONFIG_ENV)
+    if path is None and os.path.exists(DEFAULT_CONFIG_FILE):
+        path = DEFAULT_CONFIG_FILE
+    if path:
+        parser = configparser.ConfigParser()
+        if not parser.read(path, encoding='utf-8'):
+            raise FileNotFoundError(f"找不到配置文件: {path}")
+        if parser.has_section('mysql'):
+            config.update({key: value for key, value in parser['mysql'].items()
+                           if key in DEFAULT_CONFIG})
+            replicas = parser['mysql'].get('replicas', replicas)
+
+    for key, name in ENV_VARS.items():
+        if name in os.environ:
+            config[key] = os.environ[name]
+    replicas = os.environ.get(REPLICAS_ENV, replicas)
+    if replicas:
+        config['replicas'] = [host.strip() for host in replicas.split(',') if host.strip()]
+
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    return config
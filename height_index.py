@@ -0,0 +1,144 @@
+from student_statistics import DEFAULT_HEIGHT_RANGES, DEFAULT_PERCENTILES, StatisticsResult
+
+
+# 身高列是 DECIMAL(5,2)，按 0.01cm 分桶可以精确表示每一个值；
+# 导入和 upsert 不检查身高范围，桶覆盖该类型的全部取值，包括负数
+SCALE = 100
+MIN_HEIGHT = -999.99
+MAX_HEIGHT = 999.99
+
+
+class HeightIndex:
+    """按 0.01cm 分桶的树状数组（Fenwick tree），维护每个身高的人数
+
+    增删一个身高、统计任意区间的人数、取第 k 矮的身高都是 O(log n)，n 为桶数，
+    与学生人数无关。另外维护身高总和（以 0.01cm 为单位的整数），平均值没有浮点误差。
+    """
+
+    def __init__(self, min_height=MIN_HEIGHT, max_height=MAX_HEIGHT):
+        # 第 0 个桶对应 min_height
+        self._offset = round(min_height * SCALE)
+        self.size = round(max_height * SCALE) - self._offset + 1
+        self._tree = [0] * (self.size + 1)
+        self.count = 0
+        self._sum = 0
+
+    @classmethod
+    def from_values(cls, heights, min_height=MIN_HEIGHT, max_height=MAX_HEIGHT):
+        """一次建立索引，O(n + 桶数)，NULL 不计入"""
+        index = cls(min_height, max_height)
+        tree = index._tree
+        for height in heights:
+            if height is None:
+                continue
+            slot = index._slot(height)
+            tree[slot + 1] += 1
+            index.count += 1
+            index._sum += slot + index._offset
+        for i in range(1, index.size + 1):
+            parent = i + (i & -i)
+            if parent <= index.size:
+                tree[parent] += tree[i]
+        return index
+
+    def _slot(self, height):
+        slot = round(float(height) * SCALE) - self._offset
+        if not 0 <= slot < self.size:
+            raise ValueError(f"身高超出索引范围: {height}")
+        return slot
+
+    def _update(self, slot, delta):
+        i = slot + 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, slot):
+        # 桶 0..slot-1 的人数
+        total = 0
+        i = min(slot, self.size)
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _bound(self, height, upper=False):
+        # 小于 height（upper=True 时小于等于）的第一个桶之后的位置
+        # 先舍去浮点误差，160.3 * 100 = 16030.000000000002 应该落在 16030
+        slot = round(float(height) * SCALE, 6) - self._offset
+        if upper:
+            slot = int(slot // 1) + 1
+        else:
+            slot = -int(-slot // 1)
+        return max(0, min(slot, self.size))
+
+    def add(self, height):
+        if height is None:
+            return
+        slot = self._slot(height)
+        self._update(slot, 1)
+        self.count += 1
+        self._sum += slot + self._offset
+
+    def remove(self, height):
+        if height is None:
+            return
+        slot = self._slot(height)
+        self._update(slot, -1)
+        self.count -= 1
+        self._sum -= slot + self._offset
+
+    def count_below(self, height):
+        """height < 给定值的人数"""
+        return self._prefix(self._bound(height))
+
+    def count_between(self, min_height, max_height):
+        """与 SQL 的 BETWEEN 相同，两端都包含"""
+        if min_height > max_height:
+            return 0
+        return self._prefix(self._bound(max_height, True)) - self._prefix(self._bound(min_height))
+
+    def count_above(self, height):
+        """height > 给定值的人数"""
+        return self.count - self._prefix(self._bound(height, True))
+
+    def band_counts(self, ranges=None):
+        """每个 (最低, 最高, 名称) 区间的人数，区间左闭右开，与 StatisticsEngine 一致"""
+        ranges = DEFAULT_HEIGHT_RANGES if ranges is None else ranges
+        return [{'label': label, 'min': min_v, 'max': max_v,
+                 'count': self.count_below(max_v) - self.count_below(min_v)}
+                for min_v, max_v, label in ranges]
+
+    def kth(self, k):
+        """第 k 矮（从 1 开始）的身高"""
+        if not 1 <= k <= self.count:
+            raise IndexError("k超出范围")
+        position = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self._tree[nxt] < k:
+                position = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return (position + self._offset) / SCALE
+
+    def mean(self):
+        return self._sum / self.count / SCALE if self.count else None
+
+    def percentile(self, p):
+        # 与 PERCENTILE_CONT 相同的线性插值
+        rank = p / 100 * (self.count - 1)
+        lower = int(rank)
+        lower_value = self.kth(lower + 1)
+        upper_value = self.kth(min(lower + 2, self.count))
+        return lower_value + (upper_value - lower_value) * (rank - lower)
+
+    def statistics(self, total=None, ranges=None, percentiles=DEFAULT_PERCENTILES):
+        """total 为包括身高为 NULL 的总人数，默认等于有身高的人数"""
+        total = self.count if total is None else total
+        buckets = self.band_counts(ranges)
+        if not self.count:
+            return StatisticsResult(total, 0, None, None, None, buckets, {})
+        return StatisticsResult(total, self.count, self.mean(), self.kth(1), self.kth(self.count),
+                                buckets, {p: self.percentile(p) for p in percentiles})
@@ -1,120 +1,915 @@
+import base64
+import decimal
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain, islice
+
 import pymysql
+import pymysql.cursors
+
+from columnar import ColumnBuilder, column_types
+from mysql_pool import PoolExhaustedError, shared_pool
+from query_cache import QueryCache, is_cacheable, is_read, read_tables, write_table
+from query_instrumentation import QueryEvent, console_hook, emit
+from replica_router import ReplicaRouter
+from student_records import column_names, lazy_decoders
+
+
+# CRUD 语句按 (表, 列, 条件) 的形状缓存，相同形状的调用不再重复拼接字符串
+@lru_cache(maxsize=512)
+def insert_sql(table, columns):
+    placeholders = ', '.join(['%s'] * len(columns))
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+@lru_cache(maxsize=512)
+def upsert_sql(table, columns, update_columns):
+    # 用 VALUES() 引用新值，MariaDB 不支持 MySQL 8 的行别名写法；
+    # 单行模板交给 executemany 改写成多行 VALUES
+    placeholders = ', '.join(['%s'] * len(columns))
+    if update_columns:
+        updates = ', '.join(f"{column} = VALUES({column})" for column in update_columns)
+    else:
+        updates = f"{columns[0]} = {columns[0]}"
+    return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+            f"ON DUPLICATE KEY UPDATE {updates}")
+
+
+@lru_cache(maxsize=512)
+def select_sql(table, where=None, order_by=None):
+    sql = f"SELECT * FROM {table}"
+    if where:
+        sql += f" WHERE {where}"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+    return sql
+
+
+@lru_cache(maxsize=512)
+def page_sql(table, key, where=None, after=False, descending=False):
+    conditions = []
+    if where:
+        conditions.append(f"({where})")
+    if after:
+        conditions.append(f"{key} {'<' if descending else '>'} %s")
+
+    sql = f"SELECT * FROM {table}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return sql + f" ORDER BY {key} {'DESC' if descending else 'ASC'} LIMIT %s"
+
+
+def encode_page_token(value):
+    raw = json.dumps([value], default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_page_token(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode('ascii')))[0]
+    except Exception:
+        raise ValueError(f"无效的分页标记: {token}")
+
+
+@lru_cache(maxsize=512)
+def update_sql(table, columns, where):
+    set_clause = ', '.join(f"{column} = %s" for column in columns)
+    return f"UPDATE {table} SET {set_clause} WHERE {where}"
+
+
+@lru_cache(maxsize=512)
+def update_case_sql(table, key, columns, count):
+    # 每列一个 CASE，按主键取各行自己的新值
+    whens = ' '.join(['WHEN %s THEN %s'] * count)
+    set_clause = ', '.join(f"{column} = CASE {key} {whens} END" for column in columns)
+    return f"UPDATE {table} SET {set_clause} WHERE {key} IN ({', '.join(['%s'] * count)})"
+
+
+@lru_cache(maxsize=512)
+def delete_sql(table, where):
+    return f"DELETE FROM {table} WHERE {where}"
+
+
+@lru_cache(maxsize=512)
+def delete_in_sql(table, key, count):
+    return f"DELETE FROM {table} WHERE {key} IN ({', '.join(['%s'] * count)})"
+
+
+@lru_cache(maxsize=512)
+def locked_keys_sql(table, key, count):
+    return f"SELECT {key} FROM {table} WHERE {key} IN ({', '.join(['%s'] * count)}) FOR UPDATE"
+
+
+@lru_cache(maxsize=512)
+def locked_rows_sql(table, keys, count):
+    # 复合键用行构造器比较
+    row = f"({', '.join(['%s'] * len(keys))})"
+    return (f"SELECT {', '.join(keys)} FROM {table} "
+            f"WHERE ({', '.join(keys)}) IN ({', '.join([row] * count)}) FOR UPDATE")
+
+
+@lru_cache(maxsize=512)
+def count_sql(table, where=None):
+    sql = f"SELECT COUNT(*) FROM {table}"
+    if where:
+        sql += f" WHERE {where}"
+    return sql
+
+
+# 连接不上、连接断开、服务器关闭空闲连接 (wait_timeout) 时的错误码
+DISCONNECT_ERRORS = {2002, 2003, 2006, 2013, 2055, 4031}
+
+
+def is_disconnect(error):
+    if isinstance(error, pymysql.err.InterfaceError):
+        return True
+    return (isinstance(error, pymysql.err.OperationalError) and
+            bool(error.args) and error.args[0] in DISCONNECT_ERRORS)
+
+
+def normalize_key(value):
+    """把整数形式的字符串、Decimal 和 float 转成 int
+
+    服务器比较 '5' 和 5 时按列类型转换，返回的却是列本身的类型；界面输入的学号又都是
+    字符串，按同一种形式比较才能对上。
+    """
+    if isinstance(value, str):
+        text = value.strip()
+        if text.lstrip('+-').isdecimal():
+            return int(text)
+    elif isinstance(value, decimal.Decimal):
+        if value.is_finite() and value == value.to_integral_value():
+            return int(value)
+    elif isinstance(value, float):
+        if value.is_integer():
+            return int(value)
+    return value
+
+
+def check_columns(rows, columns, start=0):
+    """批量操作的每一行必须与第一行的列完全相同，否则抛出 ValueError 指出出错的行"""
+    expected = set(columns)
+    for number, row in enumerate(rows, start + 1):
+        if set(row) != expected:
+            missing = [column for column in columns if column not in row]
+            extra = [column for column in row if column not in expected]
+            raise ValueError(f"第{number}行的列与第一行不同（缺少 {missing}，多出 {extra}）: {row}")
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class StreamingResult:
+
+    def __init__(self, pool, conn, cursor, batch_size=None, hooks=(), sql=None, started=None,
+                 row_factory=None):
+        self.description = cursor.description if cursor else None
+        self.columns = column_names(cursor.description) if cursor else ()
+        self.batch_size = batch_size
+        self._make_row = row_factory(self.columns) if row_factory and cursor else None
+        self.count = 0
+        self._pool = pool
+        self._conn = conn
+        self._cursor = cursor
+        self._exhausted = False
+        self._hooks = hooks
+        self._sql = sql
+        self._started = started
+
+    def __iter__(self):
+        if self._cursor is None:
+            return
+        try:
+            while True:
+                rows = self._cursor.fetchmany(self.batch_size or 1000)
+                if not rows:
+                    self._exhausted = True
+                    break
+                self.count += len(rows)
+                if self._make_row is not None:
+                    rows = list(map(self._make_row, rows))
+                if self.batch_size:
+                    yield rows
+                else:
+                    yield from rows
+        finally:
+            self.close()
+
+    def close(self):
+        if self._cursor is None:
+            return
+        cursor, self._cursor = self._cursor, None
+
+        if self._pool is None:
+            # 非连接池模式下连接是共享的，必须读完剩余结果才能继续使用
+            cursor.close()
+        elif self._exhausted:
+            cursor.close()
+            self._pool.release(self._conn)
+        else:
+            # 提前停止时直接丢弃连接，避免为了归还连接而读完整个结果集
+            self._pool.release(self._conn, discard=True)
+
+        if self._hooks:
+            emit(self._hooks, QueryEvent('stream', self._sql, elapsed=time.perf_counter() - self._started,
+                                         rows=self.count))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
 
 class MySQLHelper:
 
-    def __init__(self, host='localhost', user='root', password='', database=''):
+    def __init__(self, host='localhost', user='root', password='', database='', pool=None,
+                 cache=None, hooks=None, lazy_decode=False, retries=3, retry_backoff=0.2,
+                 max_backoff=5.0, replicas=None):
         self.host = host
         self.user = user
         self.password = password
         self.database = database
         self.conn = None
         self.cursor = None
+        self.max_packet = None
+        self._tx = threading.local()
+
+        # DECIMAL/TIMESTAMP 列以字符串返回，由 Student 等记录类型在读取时再转换；
+        # 连接池模式下需要在创建连接池时传入 conv=lazy_decoders()
+        self.lazy_decode = lazy_decode
+
+        # 连接断开时读操作和标记为幂等的写操作自动重连重试，等待时间按指数增长
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self._stale = False
+
+        # 读查询分发到只读副本；replicas 可以是 ReplicaRouter，或 "host[:port]" / 连接池列表
+        self._owns_replicas = isinstance(replicas, (list, tuple))
+        if self._owns_replicas:
+            replicas = ReplicaRouter.from_endpoints(replicas, user, password, database)
+        self.replicas = replicas
+        self._last_write = None
+
+        # pool=True 时与连接参数相同的其他 helper 共享连接池
+        if pool is True:
+            pool = shared_pool(host, user, password, database)
+        elif isinstance(pool, dict):
+            pool = shared_pool(host, user, password, database, **pool)
+        self.pool = pool
+
+        # cache 可以是多个 helper 共享的 QueryCache，True 表示使用默认配置
+        self.cache = QueryCache() if cache is True else cache
+
+        # 每次操作结束后把 QueryEvent 交给这些 hook，默认输出控制台提示，hooks=[] 完全静默
+        self.hooks = [console_hook] if hooks is None else list(hooks)
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def _emit(self, operation, sql=None, params=None, started=None, **fields):
+        if self.hooks:
+            elapsed = time.perf_counter() - started if started is not None else 0.0
+            emit(self.hooks, QueryEvent(operation, sql, params, elapsed, **fields))
 
     def connect(self):
+        if self.pool is not None:
+            try:
+                self.pool.open()
+                self._emit('connect')
+                return True
+            except Exception as e:
+                self._emit('connect', error=e)
+                return False
+
         try:
-            self.conn = pymysql.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                charset='utf8mb4'
-            )
-            self.cursor = self.conn.cursor()
-            print("✓ 连接成功")
+            self._open_connection()
+            self._emit('connect')
             return True
         except Exception as e:
-            print(f"✗ 连接失败: {e}")
+            self._emit('connect', error=e)
             return False
 
+    def _open_connection(self):
+        options = {'conv': lazy_decoders()} if self.lazy_decode else {}
+        # 单连接模式没有归还时的回滚，读查询不能留下未结束的事务，否则一直读旧快照，
+        # 看不到其他连接（写缓冲、其他进程）提交的数据；需要事务时显式 BEGIN
+        self.conn = pymysql.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            charset='utf8mb4',
+            autocommit=True,
+            **options
+        )
+        self.cursor = self.conn.cursor()
+        self._stale = False
+
+    def reconnect(self):
+        # 连接池模式下出错的连接已被丢弃，下次取用时自动新建
+        if self.pool is not None:
+            return
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+        self._open_connection()
+
+    def _retry(self, operation, retry):
+        attempt = 0
+        while True:
+            try:
+                return operation()
+            except Exception as e:
+                if not is_disconnect(e):
+                    raise
+                # 不重试时也要在下一次操作前重新连接，而不是一直使用断开的连接
+                self._stale = True
+                if not retry or attempt >= self.retries or self.in_transaction():
+                    raise
+                attempt += 1
+                self._emit('reconnect', error=e, rows=attempt)
+                time.sleep(min(self.max_backoff, self.retry_backoff * 2 ** (attempt - 1)))
+
     def close(self):
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
-        print("✓ 连接已关闭")
+        # 连接池由其创建者负责关闭，这里不关闭共享连接池
+        if self.pool is None:
+            if self.cursor:
+                self.cursor.close()
+            if self.conn:
+                self.conn.close()
+        if self._owns_replicas:
+            self.replicas.close()
+        self._emit('close')
 
-    def run_sql(self, sql, params=None):
-        try:
-            if params:
-                self.cursor.execute(sql, params)
+    def in_transaction(self):
+        return getattr(self._tx, 'depth', 0) > 0
+
+    @contextmanager
+    def transaction(self):
+        tx = self._tx
+        if self.in_transaction():
+            # 嵌套事务用保存点实现，内层失败只回滚到保存点
+            savepoint = f"sp_{tx.depth}"
+            with tx.conn.cursor() as cursor:
+                cursor.execute(f"SAVEPOINT {savepoint}")
+            tx.depth += 1
+            try:
+                yield self
+            except Exception:
+                with tx.conn.cursor() as cursor:
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                raise
             else:
-                self.cursor.execute(sql)
+                with tx.conn.cursor() as cursor:
+                    cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+            finally:
+                tx.depth -= 1
+            return
 
-            self.conn.commit()
-            affected = self.cursor.rowcount
-            print(f"✓ 执行成功，影响{affected}行")
+        if self.pool is None and self._stale:
+            self.reconnect()
+        conn = self.conn if self.pool is None else self.pool.acquire()
+        discard = False
+        tx.conn = conn
+        tx.depth = 1
+        tx.tables = set()
+        try:
+            conn.begin()
+            yield self
+            conn.commit()
+        except Exception as e:
+            # 锁等待超时等服务器错误也是 OperationalError，连接仍然可用，必须回滚，
+            # 否则单连接模式下未结束的事务会被下一条语句一起提交
+            rolled_back = False
+            if not is_disconnect(e):
+                try:
+                    conn.rollback()
+                    rolled_back = True
+                except Exception:
+                    pass
+            if not rolled_back:
+                # 连接已断开，服务器会丢弃未提交的事务；连接池丢弃该连接，单连接下次操作前重连
+                discard = True
+                self._stale = True
+            raise
+        finally:
+            tx.conn = None
+            tx.depth = 0
+            # 事务期间其他线程可能缓存了提交前的数据，结束时再失效一次
+            for table in tx.tables:
+                self.cache.invalidate(table)
+            if self.pool is not None:
+                self.pool.release(conn, discard)
+
+    def _invalidate(self, sql=None, table=None):
+        if sql is not None and is_read(sql):
+            return
+        self._last_write = time.monotonic()
+        if self.cache is None:
+            return
+        if sql is not None:
+            table = write_table(sql)
+        if self.in_transaction():
+            self._tx.tables.add(table)
+        self.cache.invalidate(table)
+
+    @contextmanager
+    def _cursor(self):
+        if self.in_transaction():
+            conn = self._tx.conn
+            cursor = self.cursor if conn is self.conn else conn.cursor()
+            try:
+                yield conn, cursor
+            finally:
+                if cursor is not self.cursor:
+                    cursor.close()
+            return
+
+        if self.pool is None:
+            if self._stale:
+                self.reconnect()
+            yield self.conn, self.cursor
+            return
+
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield conn, cursor
+            finally:
+                cursor.close()
+
+    def _execute(self, sql, params):
+        with self._cursor() as (conn, cursor):
+            try:
+                if params:
+                    cursor.execute(sql, params)
+                else:
+                    cursor.execute(sql)
+
+                # 自动提交模式下语句执行完就已经提交，不再多一次 COMMIT 往返
+                if not self.in_transaction() and not conn.get_autocommit():
+                    conn.commit()
+            except Exception as e:
+                if (not self.in_transaction() and not is_disconnect(e) and
+                        not conn.get_autocommit()):
+                    conn.rollback()
+                raise
+            return cursor.rowcount
+
+    def run_sql(self, sql, params=None, raise_errors=False, idempotent=False):
+        # 写操作断线时可能已经执行，只有调用方标记为幂等的才重试
+        started = time.perf_counter()
+        try:
+            affected = self._retry(lambda: self._execute(sql, params), idempotent or is_read(sql))
+            self._invalidate(sql)
+            self._emit('execute', sql, params, started, rows=affected)
             return affected
 
         except Exception as e:
-            print(f"✗ 执行失败: {e}")
-            self.conn.rollback()
+            self._emit('execute', sql, params, started, error=e)
+            # 事务中的失败交给 transaction() 回滚，不能吞掉后继续提交
+            if raise_errors or self.in_transaction():
+                raise
             return 0
 
-    def get_data(self, sql, params=None):
-        try:
-            if params:
-                self.cursor.execute(sql, params)
-            else:
-                self.cursor.execute(sql)
+    def get_data(self, sql, params=None, row_factory=None, raise_errors=False):
+        started = time.perf_counter()
+        key = tables = generation = None
+        if self.cache is not None and not self.in_transaction() and is_cacheable(sql):
+            tables = read_tables(sql)
+            if tables:
+                key = self.cache.make_key(sql, params)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._emit('query', sql, params, started, rows=cached['count'], cached=True)
+                return self._make_rows(dict(cached), row_factory)
+            generation = self.cache.generation
 
-            results = self.cursor.fetchall()
-            columns = [desc[0] for desc in self.cursor.description]
-
-            print(f"✓ 查询成功，找到{len(results)}条数据")
-            return {
+        try:
+            columns, results = self._retry(lambda: self._fetch_all(sql, params), True)
+            self._emit('query', sql, params, started, rows=len(results), data=results)
+            result = {
                 'columns': columns,
                 'data': results,
                 'count': len(results)
             }
+            if key is not None:
+                self.cache.put(key, dict(result), tables, generation)
+            return self._make_rows(result, row_factory)
 
         except Exception as e:
-            print(f"✗ 查询失败: {e}")
+            self._emit('query', sql, params, started, error=e)
+            if raise_errors or self.in_transaction():
+                raise
             return {'columns': [], 'data': [], 'count': 0}
 
+    def _read_replica(self):
+        # 事务中和刚写入之后的读查询留在主库
+        if self.replicas is None or self.in_transaction():
+            return None
+        if (self._last_write is not None and
+                time.monotonic() - self._last_write < self.replicas.pin_window):
+            return None
+        return self.replicas.choose()
+
+    @staticmethod
+    def _replica_failed(error):
+        return is_disconnect(error) or isinstance(error, PoolExhaustedError)
+
+    def _fetch_all(self, sql, params):
+        index = self._read_replica()
+        if index is not None:
+            try:
+                return self.replicas.fetch_all(index, sql, params)
+            except Exception as e:
+                if not self._replica_failed(e):
+                    raise
+                # 副本连不上时这次查询改由主库执行
+                self.replicas.mark_down(index)
+
+        with self._cursor() as (conn, cursor):
+            if params:
+                cursor.execute(sql, params)
+            else:
+                cursor.execute(sql)
+            return column_names(cursor.description), cursor.fetchall()
+
+    @staticmethod
+    def _make_rows(result, row_factory):
+        # row_factory(columns) 返回单行转换函数，缓存里始终保存原始元组
+        if row_factory is not None and result['data']:
+            result['data'] = list(map(row_factory(result['columns']), result['data']))
+        return result
+
     def insert(self, table, data):
-        columns = ', '.join(data.keys())
-        placeholders = ', '.join(['%s'] * len(data))
-        sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+        sql = insert_sql(table, tuple(data))
         return self.run_sql(sql, tuple(data.values()))
 
-    def select(self, table, where=None, params=None):
-        sql = f"SELECT * FROM {table}"
-        if where:
-            sql += f" WHERE {where}"
-        return self.get_data(sql, params)
+    def _max_allowed_packet(self, cursor):
+        if self.max_packet is None:
+            cursor.execute("SELECT @@max_allowed_packet")
+            self.max_packet = cursor.fetchone()[0]
+        return self.max_packet
+
+    def insert_many(self, table, rows, chunk_size=1000):
+        if chunk_size < 1:
+            raise ValueError("chunk_size必须大于0")
+
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return {'affected': 0, 'chunks': []}
+
+        columns = tuple(first)
+        sql = insert_sql(table, columns)
+        chunks = []
+        started = time.perf_counter()
+
+        try:
+            with self._cursor() as (conn, cursor):
+                try:
+                    # executemany 会改写成多行 VALUES，单条语句不能超过 max_allowed_packet
+                    cursor.max_stmt_length = min(cursor.max_stmt_length,
+                                                 self._max_allowed_packet(cursor) - 1024)
+                    # 所有批次在一个事务里提交
+                    if not self.in_transaction():
+                        conn.begin()
+
+                    # 行可能来自生成器，逐块检查列；出错时整个事务回滚，什么都不写入
+                    done = 0
+                    for chunk in _chunked(chain([first], rows), chunk_size):
+                        check_columns(chunk, columns, done)
+                        done += len(chunk)
+                        cursor.executemany(sql, [tuple(row[c] for c in columns) for row in chunk])
+                        chunks.append(cursor.rowcount)
+
+                    if not self.in_transaction():
+                        conn.commit()
+                except Exception as e:
+                    if not self.in_transaction() and not is_disconnect(e):
+                        conn.rollback()
+                    raise
+
+            affected = sum(chunks)
+            self._invalidate(table=table)
+            self._emit('insert_many', sql, None, started, rows=affected, batches=len(chunks))
+            return {'affected': affected, 'chunks': chunks}
+
+        except Exception as e:
+            if is_disconnect(e):
+                self._stale = True
+            self._emit('insert_many', sql, None, started, error=e)
+            if self.in_transaction() or isinstance(e, ValueError):
+                raise
+            return {'affected': 0, 'chunks': []}
+
+    def stream_data(self, sql, params=None, batch_size=None, row_factory=None):
+        started = time.perf_counter()
+        try:
+            pool, conn, cursor = self._retry(lambda: self._open_stream(sql, params), True)
+            return StreamingResult(pool, conn, cursor, batch_size, self.hooks, sql, started,
+                                   row_factory)
+
+        except Exception as e:
+            self._emit('stream', sql, params, started, error=e)
+            return StreamingResult(None, None, None, batch_size)
+
+    def _open_stream(self, sql, params):
+        index = self._read_replica()
+        if index is not None:
+            pool = self.replicas.pools[index]
+            try:
+                return self._execute_stream(pool, pool.acquire(), sql, params)
+            except Exception as e:
+                if not self._replica_failed(e):
+                    raise
+                self.replicas.mark_down(index)
+
+        if self.pool is None and self._stale:
+            self.reconnect()
+        conn = self.conn if self.pool is None else self.pool.acquire()
+        return self._execute_stream(self.pool, conn, sql, params)
+
+    @staticmethod
+    def _execute_stream(pool, conn, sql, params):
+        try:
+            cursor = conn.cursor(pymysql.cursors.SSCursor)
+            if params:
+                cursor.execute(sql, params)
+            else:
+                cursor.execute(sql)
+        except Exception:
+            if pool is not None:
+                pool.release(conn, discard=True)
+            raise
+        return pool, conn, cursor
+
+    def get_columns(self, sql, params=None, types=None, batch_size=1000):
+        # 流式读取并逐批追加到列数组，不在内存里保留整份行元组
+        with self.stream_data(sql, params, batch_size) as stream:
+            builders = [ColumnBuilder(dtype) for dtype in column_types(stream.description, types)]
+            for batch in stream:
+                for builder, values in zip(builders, zip(*batch)):
+                    builder.extend(values)
+
+            return {
+                'columns': stream.columns,
+                'data': {name: builder.finish() for name, builder in zip(stream.columns, builders)},
+                'count': stream.count
+            }
+
+    def select_columnar(self, table, where=None, params=None, order_by=None, types=None):
+        return self.get_columns(select_sql(table, where, order_by), params, types)
 
-    def update(self, table, data, where, where_params=None):
-        set_parts = []
-        params = []
+    def select(self, table, where=None, params=None, order_by=None, row_factory=None):
+        return self.get_data(select_sql(table, where, order_by), params, row_factory)
 
-        for key, value in data.items():
-            set_parts.append(f"{key} = %s")
-            params.append(value)
+    def select_stream(self, table, where=None, params=None, order_by=None, batch_size=None,
+                      row_factory=None):
+        return self.stream_data(select_sql(table, where, order_by), params, batch_size,
+                                row_factory)
 
-        set_clause = ', '.join(set_parts)
-        sql = f"UPDATE {table} SET {set_clause} WHERE {where}"
+    def select_page(self, table, page_size=50, page_token=None, where=None, params=None,
+                    key='student_id', descending=False, row_factory=None):
+        # 按唯一键做 keyset 分页：每页都是一次索引范围扫描，不随页码变慢
+        if page_size < 1:
+            raise ValueError("page_size必须大于0")
+
+        query_params = list(params or ())
+        if page_token is not None:
+            query_params.append(decode_page_token(page_token))
+        # 多取一行用来判断是否还有下一页
+        query_params.append(page_size + 1)
+
+        sql = page_sql(table, key, where, page_token is not None, descending)
+        result = self.get_data(sql, tuple(query_params))
+
+        rows = result['data']
+        next_token = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            key_index = result['columns'].index(key)
+            next_token = encode_page_token(rows[-1][key_index])
+
+        page = {
+            'columns': result['columns'],
+            'data': rows,
+            'count': len(rows),
+            'next_token': next_token
+        }
+        return self._make_rows(page, row_factory)
+
+    def iter_pages(self, table, page_size=50, where=None, params=None, key='student_id',
+                   descending=False, row_factory=None):
+        page_token = None
+        while True:
+            page = self.select_page(table, page_size, page_token, where, params, key, descending,
+                                    row_factory)
+            if page['count']:
+                yield page
+            page_token = page['next_token']
+            if page_token is None:
+                return
+
+    def update(self, table, data, where, where_params=None, idempotent=False):
+        sql = update_sql(table, tuple(data), where)
+        params = tuple(data.values())
 
         if where_params:
-            params.extend(where_params)
+            params += tuple(where_params)
+
+        return self.run_sql(sql, params, idempotent=idempotent)
+
+    def delete(self, table, where, params=None, idempotent=False):
+        return self.run_sql(delete_sql(table, where), params, idempotent=idempotent)
+
+    def upsert(self, table, data, key_columns, update_columns=None):
+        # 没有冲突时影响 1 行，更新了已有行影响 2 行，已有行的值没有变化时为 0
+        columns = tuple(data)
+        if update_columns is None:
+            update_columns = tuple(column for column in columns if column not in key_columns)
+        sql = upsert_sql(table, columns, tuple(update_columns))
+
+        try:
+            affected = self.run_sql(sql, tuple(data.values()), raise_errors=True)
+        except Exception:
+            if self.in_transaction():
+                raise
+            return {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+        return {
+            'inserted': int(affected == 1),
+            'updated': int(affected == 2),
+            'unchanged': int(affected == 0)
+        }
+
+    def upsert_many(self, table, rows, key_columns, update_columns=None, chunk_size=500):
+        # 多行语句的影响行数分不清插入和未变化的行，所以每批先锁定查询已存在的键
+        if chunk_size < 1:
+            raise ValueError("chunk_size必须大于0")
+
+        key_columns = tuple(key_columns)
+        # 键相同的行只保留最后一行，'5' 和 5 是同一个键；自增主键为空的行一定是插入，
+        # 不能按键去重
+        keyed = {}
+        new_rows = []
+        for row in rows:
+            key = tuple(normalize_key(row[k]) for k in key_columns)
+            if None in key:
+                new_rows.append(row)
+            else:
+                keyed[key] = row
+        entries = list(keyed.items()) + [(None, row) for row in new_rows]
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        if not entries:
+            return counts
+
+        columns = tuple(entries[0][1])
+        if update_columns is None:
+            update_columns = tuple(column for column in columns if column not in key_columns)
+        sql = upsert_sql(table, columns, tuple(update_columns))
+        started = time.perf_counter()
+
+        try:
+            with self.transaction():
+                with self._cursor() as (conn, cursor):
+                    cursor.max_stmt_length = min(cursor.max_stmt_length,
+                                                 self._max_allowed_packet(cursor) - 1024)
+                    for chunk in _chunked(entries, chunk_size):
+                        keys = [key for key, row in chunk if key is not None]
+                        found = 0
+                        if keys:
+                            cursor.execute(locked_rows_sql(table, key_columns, len(keys)),
+                                           [value for key in keys for value in key])
+                            existing = {tuple(map(normalize_key, row)) for row in cursor.fetchall()}
+                            found = sum(1 for key in keys if key in existing)
+
+                        cursor.executemany(sql, [tuple(row[c] for c in columns)
+                                                 for key, row in chunk])
+                        inserted = len(chunk) - found
+                        changed = (cursor.rowcount - inserted) // 2
+                        counts['inserted'] += inserted
+                        counts['updated'] += changed
+                        counts['unchanged'] += found - changed
 
-        return self.run_sql(sql, tuple(params))
+            self._invalidate(table=table)
+            self._emit('upsert_many', sql, None, started,
+                       rows=counts['inserted'] + counts['updated'])
+            return counts
 
-    def delete(self, table, where, params=None):
-        sql = f"DELETE FROM {table} WHERE {where}"
-        return self.run_sql(sql, params)
+        except Exception as e:
+            self._emit('upsert_many', sql, None, started, error=e)
+            if self.in_transaction():
+                raise
+            return {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+    def _locked_keys(self, cursor, table, key, ids):
+        # 锁住本批中存在的行，返回命中的 id（调用方传入的原值）
+        cursor.execute(locked_keys_sql(table, key, len(ids)), ids)
+        existing = {normalize_key(row[0]) for row in cursor.fetchall()}
+        return {i for i in ids if normalize_key(i) in existing}
+
+    def update_many(self, table, rows, key='student_id', chunk_size=500):
+        # 每批一条 SELECT ... FOR UPDATE 和一条 CASE 更新，所有行的列必须相同
+        if chunk_size < 1:
+            raise ValueError("chunk_size必须大于0")
+
+        rows = list(rows)
+        if not rows:
+            return {'affected': 0, 'outcomes': {}}
+        if key not in rows[0]:
+            raise ValueError(f"第1行缺少键列 {key}: {rows[0]}")
+        check_columns(rows, tuple(rows[0]))
+
+        rows = {row[key]: row for row in rows}
+        columns = tuple(column for column in next(iter(rows.values())) if column != key)
+        outcomes = {}
+        affected = 0
+        started = time.perf_counter()
+
+        try:
+            with self.transaction():
+                with self._cursor() as (conn, cursor):
+                    for chunk in _chunked(rows, chunk_size):
+                        existing = self._locked_keys(cursor, table, key, chunk)
+                        found = [i for i in chunk if i in existing]
+                        for i in chunk:
+                            outcomes[i] = 'updated' if i in existing else 'not_found'
+                        if not found:
+                            continue
+
+                        params = [value for column in columns for i in found
+                                  for value in (i, rows[i][column])]
+                        cursor.execute(update_case_sql(table, key, columns, len(found)),
+                                       params + found)
+                        affected += cursor.rowcount
+
+            self._invalidate(table=table)
+            self._emit('update_many', None, None, started, rows=affected)
+            return {'affected': affected, 'outcomes': outcomes}
+
+        except Exception as e:
+            self._emit('update_many', None, None, started, error=e)
+            if self.in_transaction():
+                raise
+            return {'affected': 0, 'outcomes': {}}
+
+    def delete_many(self, table, ids, key='student_id', chunk_size=1000):
+        if chunk_size < 1:
+            raise ValueError("chunk_size必须大于0")
+
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {'affected': 0, 'outcomes': {}}
+
+        outcomes = {}
+        affected = 0
+        started = time.perf_counter()
+
+        try:
+            with self.transaction():
+                with self._cursor() as (conn, cursor):
+                    for chunk in _chunked(ids, chunk_size):
+                        existing = self._locked_keys(cursor, table, key, chunk)
+                        found = [i for i in chunk if i in existing]
+                        for i in chunk:
+                            outcomes[i] = 'deleted' if i in existing else 'not_found'
+                        if found:
+                            cursor.execute(delete_in_sql(table, key, len(found)), found)
+                            affected += cursor.rowcount
+
+            self._invalidate(table=table)
+            self._emit('delete_many', None, None, started, rows=affected)
+            return {'affected': affected, 'outcomes': outcomes}
+
+        except Exception as e:
+            self._emit('delete_many', None, None, started, error=e)
+            if self.in_transaction():
+                raise
+            return {'affected': 0, 'outcomes': {}}
 
-    def get_one(self, table, where, params=None):
-        result = self.select(table, where, params)
+    def get_one(self, table, where, params=None, row_factory=None):
+        result = self.select(table, where, params, row_factory=row_factory)
         if result['data']:
             return result['data'][0]
         return None
 
     def count(self, table, where=None, params=None):
-        sql = f"SELECT COUNT(*) FROM {table}"
-        if where:
-            sql += f" WHERE {where}"
-        result = self.get_data(sql, params)
+        result = self.get_data(count_sql(table, where), params)
         if result['data']:
             return result['data'][0][0]
         return 0
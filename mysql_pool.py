@@ -0,0 +1,211 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pymysql
+from pymysql.constants import SERVER_STATUS
+
+
+class PoolExhaustedError(Exception):
+    pass
+
+
+class ConnectionPool:
+
+    def __init__(self, host='localhost', user='root', password='', database='',
+                 min_size=1, max_size=10, idle_timeout=300, max_lifetime=3600,
+                 ping_on_checkout=True, checkout_timeout=10, charset='utf8mb4',
+                 **connect_kwargs):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("连接池大小配置无效")
+
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+        self.charset = charset
+        # 默认自动提交：读查询不会留下未结束的事务，归还时不需要再 ROLLBACK；
+        # 需要事务时 MySQLHelper 显式 BEGIN
+        connect_kwargs.setdefault('autocommit', True)
+        self.connect_kwargs = connect_kwargs
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_on_checkout = ping_on_checkout
+        self.checkout_timeout = checkout_timeout
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._created = {}
+        self._size = 0
+        self._closed = False
+
+    def _new_connection(self):
+        conn = pymysql.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            charset=self.charset,
+            **self.connect_kwargs
+        )
+        self._created[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        self._created.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, conn, last_used, now):
+        if self.max_lifetime and now - self._created.get(id(conn), now) > self.max_lifetime:
+            return True
+        if self.idle_timeout and now - last_used > self.idle_timeout:
+            return self._size > self.min_size
+        return False
+
+    def open(self):
+        with self._cond:
+            if self._closed:
+                raise PoolExhaustedError("连接池已关闭")
+            missing = self.min_size - self._size
+            self._size += max(missing, 0)
+
+        for i in range(max(missing, 0)):
+            try:
+                conn = self._new_connection()
+            except Exception:
+                with self._cond:
+                    self._size -= missing - i
+                    self._cond.notify_all()
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self):
+        deadline = None
+        if self.checkout_timeout is not None:
+            deadline = time.monotonic() + self.checkout_timeout
+
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolExhaustedError("连接池已关闭")
+
+                    now = time.monotonic()
+                    if self._idle:
+                        # 后进先出，优先复用最热的连接
+                        conn, last_used = self._idle.pop()
+                        if self._expired(conn, last_used, now):
+                            self._size -= 1
+                            self._discard(conn)
+                            conn = None
+                            continue
+                        break
+
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            raise PoolExhaustedError(
+                                f"等待连接超时（{self.checkout_timeout}秒）")
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    return self._new_connection()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if not self.ping_on_checkout:
+                return conn
+            try:
+                conn.ping(reconnect=False)
+                return conn
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                self._discard(conn)
+
+    def release(self, conn, discard=False):
+        # 归还前结束未提交的事务，避免下一个使用者读到旧快照
+        if not discard and conn.open and conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        now = time.monotonic()
+        with self._cond:
+            too_old = (self.max_lifetime and
+                       now - self._created.get(id(conn), now) > self.max_lifetime)
+            if discard or self._closed or too_old or not conn.open:
+                self._size -= 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, now))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+_shared_pools = {}
+_shared_lock = threading.Lock()
+
+
+def shared_pool(host='localhost', user='root', password='', database='', **options):
+    # 密码或连接池参数不同的 helper 使用各自的连接池；conv 等参数不可哈希，按 repr 比较
+    key = (host, user, password, database,
+           tuple(sorted((name, repr(value)) for name, value in options.items())))
+    with _shared_lock:
+        pool = _shared_pools.get(key)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(host, user, password, database, **options)
+            _shared_pools[key] = pool
+        return pool
@@ -0,0 +1,78 @@
+def escape_like(keyword):
+    return keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def has_ascii_letters(keyword):
+    return any('a' <= ch <= 'z' or 'A' <= ch <= 'Z' for ch in keyword)
+
+
+def fulltext_phrase(keyword):
+    # 布尔模式下的短语查询，去掉会被当成运算符的字符
+    cleaned = ''.join(ch for ch in keyword if ch not in '"+-<>()~*@')
+    return f'"{cleaned}"' if cleaned.strip() else None
+
+
+class NameSearch:
+    """按姓名查找学生
+
+    子串查询走 ngram 全文索引，前缀查询走 name 上的普通索引，
+    全文索引不可用时（例如 MariaDB 不支持 ngram 解析器）退回 LIKE 全表扫描。
+    InnoDB 默认的英文停用词表里有 "a"、"i" 等单个字母，ngram 解析器会丢掉包含
+    停用词的片段，拉丁字母的姓名（"Li"、"Alice"）索引不全，含英文字母的关键词也用 LIKE。
+    """
+
+    def __init__(self, db, table='students', column='name', index_name='ft_students_name',
+                 ngram_token_size=2):
+        self.db = db
+        self.table = table
+        self.column = column
+        self.index_name = index_name
+        self.ngram_token_size = ngram_token_size
+        self.fulltext = None
+
+    def has_fulltext_index(self):
+        result = self.db.get_data(
+            "SELECT COUNT(*) FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+            (self.table, self.index_name))
+        self.fulltext = bool(result['data'] and result['data'][0][0])
+        return self.fulltext
+
+    def ensure_index(self):
+        if self.has_fulltext_index():
+            return True
+        self.db.run_sql(f"ALTER TABLE {self.table} ADD FULLTEXT INDEX {self.index_name} "
+                        f"({self.column}) WITH PARSER ngram")
+        return self.has_fulltext_index()
+
+    def search_prefix(self, keyword, limit=None):
+        sql = f"SELECT * FROM {self.table} WHERE {self.column} LIKE %s ORDER BY {self.column}"
+        params = [escape_like(keyword) + '%']
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+        return self.db.get_data(sql, tuple(params))
+
+    def search(self, keyword, limit=None):
+        if self.fulltext is None:
+            self.has_fulltext_index()
+
+        like = '%' + escape_like(keyword) + '%'
+        phrase = fulltext_phrase(keyword)
+
+        # ngram 索引只保存 ngram_token_size 长度的片段，更短的关键词无法用索引；
+        # 停用词表只有英文，不含英文字母的关键词所匹配的片段都在索引里
+        if (self.fulltext and phrase and len(keyword) >= self.ngram_token_size and
+                not has_ascii_letters(keyword)):
+            sql = (f"SELECT * FROM {self.table} "
+                   f"WHERE MATCH({self.column}) AGAINST(%s IN BOOLEAN MODE) "
+                   f"AND {self.column} LIKE %s")
+            params = [phrase, like]
+        else:
+            sql = f"SELECT * FROM {self.table} WHERE {self.column} LIKE %s"
+            params = [like]
+
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+        return self.db.get_data(sql, tuple(params))
@@ -0,0 +1,137 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+
+_READ_TABLES = re.compile(r'\b(?:FROM|JOIN)\s+`?(?:\w+`?\.`?)?(\w+)`?', re.IGNORECASE)
+_WRITE_TABLE = re.compile(
+    r'^\s*(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM|'
+    r'TRUNCATE\s+(?:TABLE\s+)?|DROP\s+TABLE\s+(?:IF\s+EXISTS\s+)?|ALTER\s+TABLE|'
+    r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?)\s*`?(?:\w+`?\.`?)?(\w+)`?',
+    re.IGNORECASE)
+# 系统库中的元数据随 DDL 变化，DDL 只按被修改的表失效缓存，所以不缓存这些查询
+_SYSTEM_SCHEMA = re.compile(
+    r'\b(?:FROM|JOIN)\s+`?(?:information_schema|performance_schema|mysql|sys)`?\s*\.',
+    re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def read_tables(sql):
+    return frozenset(name.lower() for name in _READ_TABLES.findall(sql))
+
+
+@lru_cache(maxsize=1024)
+def write_table(sql):
+    match = _WRITE_TABLE.match(sql)
+    return match.group(1).lower() if match else None
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    return ' '.join(sql.split())
+
+
+def is_read(sql):
+    head = sql.lstrip()[:8].upper()
+    return head.startswith(('SELECT', 'SHOW', 'DESC', 'EXPLAIN', 'SET'))
+
+
+@lru_cache(maxsize=1024)
+def is_cacheable(sql):
+    head = sql.lstrip()[:6].upper()
+    return (head == 'SELECT' and 'FOR UPDATE' not in sql.upper() and
+            not _SYSTEM_SCHEMA.search(sql))
+
+
+class QueryCache:
+    """进程内查询结果缓存，LRU + TTL 淘汰，写表时按表失效
+
+    只能感知经过本进程 helper 的写操作，其他进程的修改要等 TTL 过期。
+    """
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._by_table = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(sql, params=None):
+        if isinstance(params, list):
+            params = tuple(params)
+        key = (normalize_sql(sql), params)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, tables, expires = entry
+            if self.ttl and time.monotonic() > expires:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, tables, generation=None):
+        with self._lock:
+            # 查询期间有写操作发生过，结果可能已经过期，不再缓存
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, tables, time.monotonic() + (self.ttl or 0))
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, tables, _ = self._entries.pop(key)
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def invalidate(self, table=None):
+        with self._lock:
+            self.generation += 1
+            if table is None:
+                self._entries.clear()
+                self._by_table.clear()
+                return
+            for key in list(self._by_table.get(table.lower(), ())):
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
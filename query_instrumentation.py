@@ -0,0 +1,174 @@
+import logging
+import threading
+from bisect import bisect_left
+
+from query_cache import normalize_sql
+
+
+# 延迟直方图的桶上限（秒），最后一个桶收集所有更慢的语句
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+slow_query_logger = logging.getLogger('mysql_helper.slow_query')
+
+
+def estimate_bytes(data):
+    total = 0
+    for row in data:
+        for value in row:
+            if value is None:
+                continue
+            if isinstance(value, (str, bytes, bytearray)):
+                total += len(value)
+            else:
+                total += 8
+    return total
+
+
+class QueryEvent:
+    """一次数据库操作的记录，由 helper 传给每个 hook"""
+
+    __slots__ = ('operation', 'sql', 'params', 'elapsed', 'rows', 'error',
+                 'cached', 'batches', '_data', '_bytes')
+
+    def __init__(self, operation, sql=None, params=None, elapsed=0.0, rows=0, error=None,
+                 cached=False, batches=None, data=None):
+        self.operation = operation
+        self.sql = sql
+        self.params = params
+        self.elapsed = elapsed
+        self.rows = rows
+        self.error = error
+        self.cached = cached
+        self.batches = batches
+        self._data = data
+        self._bytes = None
+
+    @property
+    def bytes(self):
+        # 按需估算，没有 hook 读取时不产生任何开销
+        if self._bytes is None:
+            self._bytes = estimate_bytes(self._data) if self._data else 0
+        return self._bytes
+
+
+def console_hook(event):
+    """输出与早期版本相同的控制台提示"""
+    operation = event.operation
+    if operation == 'reconnect':
+        print(f"⚠️ 数据库连接已断开，第{event.rows}次重连: {event.error}")
+    elif event.error is not None:
+        labels = {'connect': '连接失败', 'execute': '执行失败', 'insert_many': '批量插入失败',
+                  'update_many': '批量更新失败', 'delete_many': '批量删除失败',
+                  'upsert_many': '批量写入失败'}
+        print(f"✗ {labels.get(operation, '查询失败')}: {event.error}")
+    elif operation == 'connect':
+        print("✓ 连接成功")
+    elif operation == 'close':
+        print("✓ 连接已关闭")
+    elif operation == 'execute':
+        print(f"✓ 执行成功，影响{event.rows}行")
+    elif operation == 'insert_many':
+        print(f"✓ 批量插入成功，共{event.batches}批，影响{event.rows}行")
+    elif operation == 'update_many':
+        print(f"✓ 批量更新成功，影响{event.rows}行")
+    elif operation == 'delete_many':
+        print(f"✓ 批量删除成功，影响{event.rows}行")
+    elif operation == 'upsert_many':
+        print(f"✓ 批量写入成功，插入或更新{event.rows}行")
+    elif operation == 'stream':
+        print(f"✓ 流式查询完成，共{event.rows}条数据")
+    else:
+        source = "（缓存）" if event.cached else ""
+        print(f"✓ 查询成功{source}，找到{event.rows}条数据")
+
+
+def emit(hooks, event):
+    for hook in hooks:
+        try:
+            hook(event)
+        except Exception:
+            # 监控代码的问题不能影响业务查询
+            logging.getLogger('mysql_helper').exception("instrumentation hook 出错")
+
+
+class QueryMetrics:
+    """累计每类语句的耗时、行数、字节数和错误，记录慢查询并导出延迟直方图"""
+
+    def __init__(self, slow_threshold=0.5, buckets=DEFAULT_LATENCY_BUCKETS,
+                 track_bytes=False, logger=None):
+        self.slow_threshold = slow_threshold
+        self.buckets = tuple(buckets)
+        self.track_bytes = track_bytes
+        self.logger = logger or slow_query_logger
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.histogram = [0] * (len(self.buckets) + 1)
+            self.statements = {}
+            self.total = 0
+            self.errors = 0
+            self.slow = 0
+            self.reconnects = 0
+
+    def __call__(self, event):
+        if event.operation in ('connect', 'close'):
+            return
+        if event.operation == 'reconnect':
+            # 重连后成功的语句不算错误，单独计数
+            with self._lock:
+                self.reconnects += 1
+            return
+
+        key = normalize_sql(event.sql) if event.sql else event.operation
+        size = event.bytes if self.track_bytes else 0
+        slow = self.slow_threshold is not None and event.elapsed >= self.slow_threshold
+
+        with self._lock:
+            self.total += 1
+            self.histogram[bisect_left(self.buckets, event.elapsed)] += 1
+
+            stat = self.statements.get(key)
+            if stat is None:
+                stat = self.statements[key] = {
+                    'calls': 0, 'total_time': 0.0, 'max_time': 0.0,
+                    'rows': 0, 'bytes': 0, 'errors': 0, 'cache_hits': 0
+                }
+            stat['calls'] += 1
+            stat['total_time'] += event.elapsed
+            stat['max_time'] = max(stat['max_time'], event.elapsed)
+            stat['rows'] += event.rows or 0
+            stat['bytes'] += size
+            if event.cached:
+                stat['cache_hits'] += 1
+            if event.error is not None:
+                stat['errors'] += 1
+                self.errors += 1
+            if slow:
+                self.slow += 1
+
+        if slow:
+            self.logger.warning("慢查询 %.3fs rows=%s: %s", event.elapsed, event.rows, key)
+
+    def export_histogram(self):
+        with self._lock:
+            bounds = [str(b) for b in self.buckets] + ['+Inf']
+            cumulative = []
+            running = 0
+            for count in self.histogram:
+                running += count
+                cumulative.append(running)
+            return dict(zip(bounds, cumulative))
+
+    def export(self):
+        histogram = self.export_histogram()
+        with self._lock:
+            return {
+                'total': self.total,
+                'errors': self.errors,
+                'slow': self.slow,
+                'reconnects': self.reconnects,
+                'latency_histogram': histogram,
+                'statements': {sql: dict(stat) for sql, stat in self.statements.items()}
+            }
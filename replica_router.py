@@ -0,0 +1,160 @@
+import threading
+import time
+
+import pymysql
+
+from mysql_pool import ConnectionPool
+from student_records import column_names
+
+
+def parse_endpoint(endpoint):
+    # "host" 或 "host:port"
+    host, sep, port = endpoint.rpartition(':')
+    if not sep:
+        return endpoint, None
+    return host, int(port)
+
+
+class ReplicaRouter:
+    """把读查询分发到只读副本
+
+    strategy 为 'round_robin' 时轮流使用副本，为 'least_latency' 时选最近查询
+    耗时最短的副本。复制延迟超过 max_lag 秒、延迟未知或者连接出错的副本暂时
+    不参与分发，所有副本都不可用时由调用方退回主库。
+    """
+
+    def __init__(self, pools, strategy='round_robin', pin_window=2.0, max_lag=5.0,
+                 lag_check_interval=5.0, retry_after=10.0):
+        if strategy not in ('round_robin', 'least_latency'):
+            raise ValueError(f"未知的副本选择策略: {strategy}")
+        if not pools:
+            raise ValueError("至少需要一个副本")
+
+        self.pools = list(pools)
+        self.strategy = strategy
+        # 写入后的这段时间内同一个 helper 的读查询留在主库，避免读不到刚写的数据
+        self.pin_window = pin_window
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.retry_after = retry_after
+
+        count = len(self.pools)
+        self._lock = threading.Lock()
+        self._next = 0
+        self._latency = [0.0] * count
+        self._lag = [None] * count
+        self._lag_checked = [None] * count
+        self._down_until = [0.0] * count
+        self._status_sql = [None] * count
+        self._reads = [0] * count
+
+    @classmethod
+    def from_endpoints(cls, endpoints, user, password, database, pool_options=None, **options):
+        pools = []
+        for endpoint in endpoints:
+            if isinstance(endpoint, ConnectionPool):
+                pools.append(endpoint)
+                continue
+            host, port = parse_endpoint(endpoint)
+            kwargs = dict(pool_options or {})
+            if port is not None:
+                kwargs['port'] = port
+            kwargs.setdefault('min_size', 0)
+            pools.append(ConnectionPool(host, user, password, database, **kwargs))
+        return cls(pools, **options)
+
+    def _read_lag(self, index):
+        # MySQL 8.0.22 起是 SHOW REPLICA STATUS，更早的版本和 MariaDB 用 SHOW SLAVE STATUS
+        with self.pools[index].connection() as conn:
+            with conn.cursor() as cursor:
+                statements = ([self._status_sql[index]] if self._status_sql[index]
+                              else ["SHOW REPLICA STATUS", "SHOW SLAVE STATUS"])
+                for sql in statements:
+                    try:
+                        cursor.execute(sql)
+                    except pymysql.err.ProgrammingError:
+                        continue
+                    self._status_sql[index] = sql
+                    row = cursor.fetchone()
+                    if row is None:
+                        # 没有配置复制的独立实例，视为没有延迟
+                        return 0
+                    status = dict(zip(column_names(cursor.description), row))
+                    return status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        return None
+
+    def lag(self, index, now=None):
+        now = time.monotonic() if now is None else now
+        checked = self._lag_checked[index]
+        if checked is None or now - checked >= self.lag_check_interval:
+            try:
+                lag = self._read_lag(index)
+            except Exception:
+                self.mark_down(index)
+                lag = None
+            with self._lock:
+                self._lag[index] = lag
+                self._lag_checked[index] = now
+        return self._lag[index]
+
+    def usable(self, index, now=None):
+        now = time.monotonic() if now is None else now
+        if now < self._down_until[index]:
+            return False
+        lag = self.lag(index, now)
+        return lag is not None and lag <= self.max_lag
+
+    def choose(self):
+        """返回本次读查询使用的副本序号，没有可用副本时返回 None"""
+        now = time.monotonic()
+        candidates = [i for i in range(len(self.pools)) if self.usable(i, now)]
+        if not candidates:
+            return None
+
+        with self._lock:
+            if self.strategy == 'least_latency':
+                return min(candidates, key=lambda i: self._latency[i])
+            for _ in range(len(self.pools)):
+                index = self._next
+                self._next = (self._next + 1) % len(self.pools)
+                if index in candidates:
+                    return index
+            return candidates[0]
+
+    def record(self, index, elapsed):
+        # 指数加权平均，偶尔一次慢查询不会让副本长期被冷落
+        with self._lock:
+            self._reads[index] += 1
+            previous = self._latency[index]
+            self._latency[index] = elapsed if not previous else previous * 0.8 + elapsed * 0.2
+
+    def mark_down(self, index):
+        with self._lock:
+            self._down_until[index] = time.monotonic() + self.retry_after
+            self._lag_checked[index] = None
+
+    def fetch_all(self, index, sql, params=None):
+        started = time.perf_counter()
+        with self.pools[index].connection() as conn:
+            with conn.cursor() as cursor:
+                if params:
+                    cursor.execute(sql, params)
+                else:
+                    cursor.execute(sql)
+                result = column_names(cursor.description), cursor.fetchall()
+        self.record(index, time.perf_counter() - started)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return [{
+                'host': pool.host,
+                'reads': self._reads[i],
+                'latency': self._latency[i],
+                'lag': self._lag[i],
+                'down': time.monotonic() < self._down_until[i]
+            } for i, pool in enumerate(self.pools)]
+
+    def close(self):
+        for pool in self.pools:
+            pool.close()
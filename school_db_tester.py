@@ -1,18 +1,38 @@
+import asyncio
+import decimal
+import os
+import tempfile
+import threading
+import time
+
 import pymysql
+from pymysql.constants import SERVER_STATUS
+from benchmark import ALL_OPERATIONS, Benchmark
+from db_config import load_config
+from height_index import HeightIndex
 from mysql_helper import MySQLHelper
+from mysql_pool import ConnectionPool, shared_pool
+from name_search import NameSearch
+from query_cache import QueryCache, is_cacheable
+from query_instrumentation import QueryMetrics
+from replica_router import ReplicaRouter
+from sharded_helper import ShardQueryError, ShardedHelper
+from student_io import (ensure_checkpoint_table, export_file, import_file, load_data_sql,
+                        read_csv_header)
+from student_records import Student, named_rows
+from student_roster import StudentRoster
+from student_schema import migrate, missing_indexes
+from student_statistics import StatisticsEngine, statistics_from_values
+from write_buffer import WriteBuffer
 
 
 class SchoolDBTester:
     """学校数据库测试类"""
 
-    def __init__(self):
+    def __init__(self, **config):
         """初始化测试类"""
-        self.db = MySQLHelper(
-            host='localhost',
-            user='root',
-            password='123456',  # 改成你的密码
-            database='school_db'
-        )
+        # 连接信息来自参数、MYSQL_* 环境变量或 school_db.ini
+        self.db = MySQLHelper(**load_config(**config))
         self.test_passed = 0
         self.test_failed = 0
 
@@ -57,33 +77,16 @@ class SchoolDBTester:
 
     def test_create_table(self):
         """测试创建表"""
-        create_sql = """
-                     CREATE TABLE IF NOT EXISTS test_students \
-                     ( \
-                         student_id \
-                         INT \
-                         PRIMARY \
-                         KEY \
-                         AUTO_INCREMENT, \
-                         name \
-                         VARCHAR \
-                     ( \
-                         50 \
-                     ) NOT NULL,
-                         height DECIMAL \
-                     ( \
-                         5, \
-                         2 \
-                     )
-                         ) \
-                     """
-        affected = self.db.run_sql(create_sql)
-        assert affected == 0, "创建表应该影响0行"
+        assert migrate(self.db, 'test_students'), "表结构迁移应该成功"
 
         # 验证表是否存在
         result = self.db.get_data("SHOW TABLES LIKE 'test_students'")
         assert result['count'] == 1, "表应该存在"
 
+        # 验证常用查询需要的索引都已创建
+        missing = missing_indexes(self.db, 'test_students')
+        assert not missing, f"缺少索引: {', '.join(missing)}"
+
     def test_insert_data(self):
         """测试插入数据"""
         test_data = {'name': '测试学生', 'height': 170.5}
@@ -187,6 +190,766 @@ class SchoolDBTester:
                                   """)
         assert len(result['data']) > 0, "分组查询应该有结果"
 
+    def test_insert_many(self):
+        """测试批量插入"""
+        initial_count = self.db.count('test_students')
+        students = [{'name': f'批量学生{i}', 'height': 150 + i % 50} for i in range(25)]
+
+        result = self.db.insert_many('test_students', students, chunk_size=10)
+        assert result['chunks'] == [10, 10, 5], "应该分3批插入"
+        assert result['affected'] == 25, "应该插入25行数据"
+
+        new_count = self.db.count('test_students')
+        assert new_count == initial_count + 25, "数量应该增加25个"
+
+        # 列与第一行不同的行不能被静默丢掉列，整批都不写入
+        for bad in ({'name': '批量异常学生'}, {'name': '批量异常学生', 'height': 160.0, 'age': 1}):
+            rows = [{'name': '批量异常学生', 'height': 160.0}] * 11 + [bad]
+            try:
+                self.db.insert_many('test_students', rows, chunk_size=10)
+                assert False, "列不一致时应该抛出ValueError"
+            except ValueError as e:
+                assert "第12行" in str(e), f"错误信息应该指出出错的行: {e}"
+        assert self.db.count('test_students') == new_count, "列不一致时不应写入任何行"
+
+    def test_bulk_update_delete(self):
+        """测试按学号批量更新和删除"""
+        self.db.insert_many('test_students', [{'name': f'批改学生{i}', 'height': 160.0}
+                                              for i in range(5)])
+        ids = [row[0] for row in self.db.select('test_students', 'name LIKE %s',
+                                                ('批改学生%',))['data']]
+        missing_id = max(ids) + 1000
+
+        rows = [{'student_id': i, 'height': 170.0 + n} for n, i in enumerate(ids)]
+        rows.append({'student_id': missing_id, 'height': 180.0})
+        result = self.db.update_many('test_students', rows, chunk_size=2)
+        assert result['affected'] == len(ids), "应该更新全部存在的学生"
+        assert result['outcomes'][missing_id] == 'not_found', "不存在的学号应该报告not_found"
+        for n, i in enumerate(ids):
+            assert result['outcomes'][i] == 'updated', "存在的学号应该报告updated"
+            student = self.db.get_one('test_students', 'student_id = %s', (i,))
+            assert float(student[2]) == 170.0 + n, "每个学生应该更新为自己的身高"
+
+        # 后面的行多出或缺少列时不能只更新第一行的列
+        try:
+            self.db.update_many('test_students', [{'student_id': ids[0], 'height': 175.0},
+                                                  {'student_id': ids[1], 'name': '批改改名'}])
+            assert False, "列不一致时应该抛出ValueError"
+        except ValueError as e:
+            assert "第2行" in str(e), f"错误信息应该指出出错的行: {e}"
+
+        # 界面输入的学号是字符串，也应该能对上服务器返回的整数学号
+        targets = [str(i) for i in ids[:2]] + ids[2:]
+        result = self.db.delete_many('test_students', targets + [missing_id], chunk_size=2)
+        assert result['affected'] == len(ids), "应该删除全部存在的学生"
+        assert result['outcomes'][missing_id] == 'not_found', "不存在的学号应该报告not_found"
+        assert all(result['outcomes'][i] == 'deleted' for i in targets), "存在的学号应该报告deleted"
+        assert self.db.count('test_students', 'name LIKE %s', ('批改学生%',)) == 0, "学生应该被删除"
+
+    def test_upsert(self):
+        """测试插入或更新"""
+        student_id = self.db.get_data("SELECT MAX(student_id) FROM test_students")['data'][0][0] or 0
+        new_id = student_id + 1000
+        data = {'student_id': new_id, 'name': '同步学生', 'height': 170.0}
+
+        assert self.db.upsert('test_students', data, ['student_id'])['inserted'] == 1, "新学号应该插入"
+        data['height'] = 171.0
+        assert self.db.upsert('test_students', data, ['student_id'])['updated'] == 1, "已有学号应该更新"
+        assert self.db.upsert('test_students', data, ['student_id'])['unchanged'] == 1, \
+            "值没有变化时应该报告unchanged"
+        student = self.db.get_one('test_students', 'student_id = %s', (new_id,))
+        assert float(student[2]) == 171.0, "身高应该被更新"
+
+        rows = [
+            {'student_id': new_id, 'name': '同步学生', 'height': 172.0},
+            {'student_id': new_id + 1, 'name': '同步学生2', 'height': 165.0},
+            {'student_id': new_id + 2, 'name': '同步学生3', 'height': 166.0}
+        ]
+        counts = self.db.upsert_many('test_students', rows, ['student_id'], chunk_size=2)
+        assert counts == {'inserted': 2, 'updated': 1, 'unchanged': 0}, f"批量结果不正确: {counts}"
+
+        counts = self.db.upsert_many('test_students', rows, ['student_id'], ['height'])
+        assert counts == {'inserted': 0, 'updated': 0, 'unchanged': 3}, f"重复同步不应有变化: {counts}"
+
+        # 字符串学号与整数学号是同一个键，不能重复计为插入
+        rows = [{'student_id': str(new_id), 'name': '同步学生', 'height': 173.0},
+                {'student_id': new_id, 'name': '同步学生', 'height': 173.0}]
+        counts = self.db.upsert_many('test_students', rows, ['student_id'])
+        assert counts == {'inserted': 0, 'updated': 1, 'unchanged': 0}, f"字符串学号结果不正确: {counts}"
+
+        self.db.delete_many('test_students', [new_id, new_id + 1, new_id + 2])
+
+        # 学号为空的行都是新学生，不能按键去重
+        total = self.db.count('test_students')
+        rows = [{'student_id': None, 'name': '同步新生', 'height': 160.0 + i} for i in range(3)]
+        counts = self.db.upsert_many('test_students', rows, ['student_id'])
+        assert counts['inserted'] == 3, f"学号为空的行应该全部插入: {counts}"
+        assert self.db.count('test_students') == total + 3, "应该插入3名新学生"
+        self.db.delete('test_students', 'name = %s', ('同步新生',))
+
+    def test_stream(self):
+        """测试流式查询"""
+        total = self.db.count('test_students')
+
+        with self.db.select_stream('test_students', order_by='student_id') as stream:
+            assert stream.columns[:3] == ('student_id', 'name', 'height'), "应该保留列信息"
+            rows = list(stream)
+        assert len(rows) == total, "流式查询应该返回全部数据"
+
+        with self.db.select_stream('test_students', batch_size=2) as stream:
+            first_batch = next(iter(stream))
+        assert len(first_batch) <= 2, "每批数据不应超过batch_size"
+
+        # 提前停止后连接应该可以继续使用
+        assert self.db.count('test_students') == total, "提前停止后连接应该仍然可用"
+
+    def test_transaction(self):
+        """测试事务和保存点"""
+        initial_count = self.db.count('test_students')
+
+        with self.db.transaction():
+            self.db.insert('test_students', {'name': '事务学生1', 'height': 170.0})
+            try:
+                with self.db.transaction():
+                    self.db.insert('test_students', {'name': '事务学生2', 'height': 171.0})
+                    raise RuntimeError("回滚内层事务")
+            except RuntimeError:
+                pass
+        assert self.db.count('test_students') == initial_count + 1, "只有外层插入应该被提交"
+
+        try:
+            with self.db.transaction():
+                self.db.insert('test_students', {'name': '事务学生3', 'height': 172.0})
+                raise RuntimeError("回滚整个事务")
+        except RuntimeError:
+            pass
+        assert self.db.count('test_students') == initial_count + 1, "整个事务应该被回滚"
+
+        # 未知列（1054）这类服务器错误同样是 OperationalError，事务也必须回滚，
+        # 不能被之后的语句一起提交
+        try:
+            with self.db.transaction():
+                self.db.insert('test_students', {'name': '事务学生4', 'height': 173.0})
+                self.db.run_sql("UPDATE test_students SET no_such_column = 1")
+        except Exception:
+            pass
+        self.db.run_sql("UPDATE test_students SET height = height WHERE student_id = 0")
+        assert self.db.count('test_students') == initial_count + 1, "出错的事务不应该被提交"
+
+    def test_statistics(self):
+        """测试统计引擎"""
+        stats = StatisticsEngine(self.db, table='test_students').compute()
+        assert stats.total == self.db.count('test_students'), "总人数应该与COUNT一致"
+
+        result = self.db.get_data("SELECT AVG(height), MIN(height), MAX(height) FROM test_students")
+        avg_height, min_height, max_height = result['data'][0]
+        assert abs(stats.mean - float(avg_height)) < 0.01, "平均身高应该与AVG一致"
+        assert stats.min == float(min_height), "最低身高应该与MIN一致"
+        assert stats.max == float(max_height), "最高身高应该与MAX一致"
+
+        bucket_total = sum(bucket['count'] for bucket in stats.buckets)
+        assert bucket_total <= stats.total, "分布人数不应超过总人数"
+        assert stats.min <= stats.percentiles[50] <= stats.max, "中位数应该在最值之间"
+
+    def test_columnar(self):
+        """测试列式查询"""
+        rows = self.db.select('test_students', order_by='student_id')
+        result = self.db.select_columnar('test_students', order_by='student_id')
+        assert result['count'] == rows['count'], "列式查询行数应该一致"
+
+        ids = result['data']['student_id']
+        heights = result['data']['height']
+        assert len(ids) == len(heights) == rows['count'], "每一列的长度应该等于行数"
+        assert [int(i) for i in ids] == [row[0] for row in rows['data']], "学号列应该一致"
+
+        stats = statistics_from_values(heights)
+        expected = StatisticsEngine(self.db, table='test_students').compute()
+        assert stats.total == expected.total, "总人数应该一致"
+        assert stats.counted == expected.counted, "有身高的人数应该一致"
+        if expected.counted:
+            assert abs(stats.mean - expected.mean) < 0.01, "平均身高应该一致"
+            assert [b['count'] for b in stats.buckets] == [b['count'] for b in expected.buckets], \
+                "身高分布应该一致"
+            assert abs(stats.percentiles[50] - expected.percentiles[50]) < 0.01, "中位数应该一致"
+
+    def test_cache(self):
+        """测试查询缓存"""
+        cache = QueryCache()
+        self.db.cache = cache
+        try:
+            first = self.db.count('test_students')
+            second = self.db.count('test_students')
+            assert second == first, "缓存结果应该一致"
+            assert cache.stats()['hits'] == 1, "第二次查询应该命中缓存"
+
+            self.db.insert('test_students', {'name': '缓存学生', 'height': 168.0})
+            assert self.db.count('test_students') == first + 1, "写入后缓存应该失效"
+            assert cache.stats()['misses'] == 2, "失效后应该重新查询"
+
+            # DDL 不会按 information_schema 的表名失效缓存，这些查询不能缓存
+            assert not is_cacheable("SELECT COUNT(*) FROM information_schema.statistics "
+                                    "WHERE table_name = %s"), "不应该缓存系统库查询"
+            assert is_cacheable("SELECT * FROM test_students"), "普通查询应该可以缓存"
+        finally:
+            self.db.cache = None
+
+    def test_instrumentation(self):
+        """测试查询监控"""
+        metrics = QueryMetrics(slow_threshold=None, track_bytes=True)
+        hooks = self.db.hooks
+        self.db.hooks = [metrics]
+        try:
+            self.db.count('test_students')
+            self.db.select('test_students')
+            self.db.get_data("SELECT * FROM not_exists_table")
+        finally:
+            self.db.hooks = hooks
+
+        report = metrics.export()
+        assert report['total'] == 3, "应该记录3条语句"
+        assert report['errors'] == 1, "应该记录1次错误"
+        assert report['latency_histogram']['+Inf'] == 3, "直方图应该包含所有语句"
+        select_stat = report['statements']['SELECT * FROM test_students']
+        assert select_stat['rows'] == self.db.count('test_students'), "应该记录返回行数"
+        assert select_stat['bytes'] > 0, "应该记录读取的字节数"
+
+    def test_pagination(self):
+        """测试keyset分页"""
+        all_ids = [row[0] for row in self.db.select('test_students', order_by='student_id')['data']]
+
+        paged_ids = []
+        for page in self.db.iter_pages('test_students', page_size=7):
+            assert page['count'] <= 7, "每页不应超过page_size"
+            paged_ids.extend(row[0] for row in page['data'])
+        assert paged_ids == all_ids, "分页结果应该与完整查询一致"
+
+        first = self.db.select_page('test_students', page_size=2, where='height > %s', params=(170,))
+        if first['next_token']:
+            second = self.db.select_page('test_students', 2, first['next_token'],
+                                         where='height > %s', params=(170,))
+            assert second['data'][0][0] > first['data'][-1][0], "下一页应该从上一页之后开始"
+
+    def test_name_search(self):
+        """测试姓名查找"""
+        search = NameSearch(self.db, table='test_students', index_name='ft_test_students_name')
+        search.ensure_index()
+
+        # 拉丁字母的姓名包含停用词 "a"、"i"，在 ngram 索引里不完整
+        latin = ['Li Lei', 'Alice', 'Ai']
+        self.db.insert_many('test_students', [{'name': name, 'height': 165.0} for name in latin])
+        try:
+            for keyword in ['学生', '批量学生1', '生', '不存在的名字', 'Li', 'Ali', 'Ai']:
+                expected = self.db.select('test_students', 'name LIKE %s', (f'%{keyword}%',))
+                result = search.search(keyword)
+                assert sorted(result['data']) == sorted(expected['data']), \
+                    f"'{keyword}'的查找结果应该与LIKE一致"
+        finally:
+            self.db.delete_many('test_students', [row[0] for row in self.db.select(
+                'test_students', 'name IN (%s, %s, %s)', tuple(latin))['data']])
+
+        result = search.search_prefix('批量')
+        assert all(row[1].startswith('批量') for row in result['data']), "前缀查找结果应该以关键词开头"
+
+    def test_pool(self):
+        """测试连接池"""
+        pool = ConnectionPool(self.db.host, self.db.user, self.db.password,
+                              self.db.database, min_size=1, max_size=3)
+        errors = []
+
+        def worker():
+            helper = MySQLHelper(pool=pool)
+            if helper.count('test_students') < 0:
+                errors.append("统计结果不应为负数")
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # 连接池的连接默认自动提交，读查询之后不需要在归还时 ROLLBACK
+        with pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM test_students")
+                cursor.fetchall()
+            in_transaction = conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS
+
+        stats = pool.stats()
+        pool.close()
+        assert not errors, errors[0] if errors else ""
+        assert stats['size'] <= 3, "连接数不应超过连接池上限"
+        assert stats['in_use'] == 0, "所有连接都应归还连接池"
+        assert not in_transaction, "读查询不应该留下未结束的事务"
+
+        # 连接参数不同的 helper 不能共用同一个共享连接池
+        options = (self.db.host, self.db.user, self.db.password, self.db.database)
+        shared = shared_pool(*options, max_size=2)
+        try:
+            assert shared_pool(*options, max_size=2) is shared, "相同参数应该共用连接池"
+            other = shared_pool(*options, max_size=3)
+            assert other is not shared, "连接池参数不同时不应共用连接池"
+            other.close()
+        finally:
+            shared.close()
+
+    def test_async(self):
+        """测试异步helper"""
+        # aiomysql 是可选依赖，只在运行这个测试时导入
+        from async_mysql_helper import AsyncMySQLHelper
+
+        async def run():
+            db = AsyncMySQLHelper(self.db.host, self.db.user, self.db.password,
+                                  self.db.database, max_size=5)
+            assert await db.connect(), "异步连接失败"
+            try:
+                counts = await asyncio.gather(*[db.count('test_students') for _ in range(10)])
+                assert len(set(counts)) == 1, "并发查询结果应该一致"
+
+                streamed = 0
+                async with db.select_stream('test_students', batch_size=5) as stream:
+                    async for batch in stream:
+                        streamed += len(batch)
+                assert streamed == counts[0], "异步流式查询应该返回全部数据"
+            finally:
+                await db.close()
+
+        asyncio.run(run())
+
+    def test_import_export(self):
+        """测试CSV / JSON-lines导入导出"""
+        table = 'io_test_students'
+        self.db.run_sql(f"DROP TABLE IF EXISTS {table}")
+        assert migrate(self.db, table), "创建测试表失败"
+        ensure_checkpoint_table(self.db)
+        self.db.run_sql("DELETE FROM import_checkpoints WHERE table_name = %s", (table,))
+        expected = self.db.count('test_students')
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ('students.csv', 'students.jsonl'):
+                path = os.path.join(directory, name)
+                assert export_file(self.db, path, 'test_students', batch_size=4) == expected, \
+                    f"{name}应该导出全部学生"
+
+                self.db.run_sql(f"DELETE FROM {table}")
+                result = import_file(self.db, path, table, chunk_size=4)
+                assert result['imported'] + result['rejected'] == expected, f"{name}应该导入全部行"
+                assert self.db.count(table) == result['imported'], "表中行数应该等于导入行数"
+
+                # 导入完成后断点被删除，同一路径的文件再次导入时从头开始
+                assert self.db.count('import_checkpoints', 'table_name = %s', (table,)) == 0, \
+                    "导入完成后应该删除断点"
+                self.db.run_sql(f"DELETE FROM {table}")
+                again = import_file(self.db, path, table, chunk_size=4)
+                assert again['resumed_from'] == 0 and again['imported'] == result['imported'], \
+                    "再次导入应该从头开始"
+
+            # 第一块提交后中断，再次导入应该从断点继续
+            path = os.path.join(directory, 'students.csv')
+            self.db.run_sql(f"DELETE FROM {table}")
+
+            def interrupt(count):
+                raise KeyboardInterrupt
+
+            try:
+                import_file(self.db, path, table, chunk_size=3, restart=True, progress=interrupt)
+            except KeyboardInterrupt:
+                pass
+            resumed = import_file(self.db, path, table, chunk_size=3)
+            if expected > 3:
+                assert resumed['resumed_from'] == 3, "应该从第一块之后继续"
+            assert self.db.count(table) == expected - resumed['rejected'], "续传后不应重复或缺少数据"
+
+            # 中断后文件被重新生成（修改时间变化），不能沿用旧文件的断点
+            self.db.run_sql(f"DELETE FROM {table}")
+            try:
+                import_file(self.db, path, table, chunk_size=3, restart=True, progress=interrupt)
+            except KeyboardInterrupt:
+                pass
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            self.db.run_sql(f"DELETE FROM {table}")
+            fresh = import_file(self.db, path, table, chunk_size=3)
+            assert fresh['resumed_from'] == 0, "文件变化后应该从头导入"
+            assert self.db.count(table) == expected - fresh['rejected'], "重新生成的文件应该全部导入"
+
+            # LOAD DATA 按导出文件的表头对应列，不需要的列读入 @dummy
+            sql = load_data_sql(table, read_csv_header(path))
+            assert "(@dummy, @c1, @c2, @dummy, @dummy)" in sql, f"列对应不正确: {sql}"
+            assert "SET name = NULLIF(@c1, ''), height = NULLIF(@c2, '')" in sql, \
+                f"应该按列名导入name和height: {sql}"
+
+    def test_reconnect(self):
+        """测试断线重连"""
+        metrics = QueryMetrics(slow_threshold=None)
+        db = MySQLHelper(self.db.host, self.db.user, self.db.password, self.db.database,
+                         hooks=[metrics], retry_backoff=0.01)
+        assert db.connect(), "连接失败"
+
+        def kill():
+            # 用另一个连接杀掉 db 的连接，模拟服务器重启或 wait_timeout
+            connection_id = db.get_data("SELECT CONNECTION_ID()")['data'][0][0]
+            self.db.run_sql("KILL %s", (connection_id,))
+
+        try:
+            before = db.count('test_students')
+
+            kill()
+            assert db.count('test_students') == before, "断线后读操作应该自动重连"
+            assert metrics.reconnects == 1, "应该重连一次"
+
+            kill()
+            assert db.insert('test_students', {'name': '重连学生', 'height': 170.0}) == 0, \
+                "未标记幂等的写操作断线后不应重试"
+            assert db.count('test_students') == before, "下一次操作应该使用新连接"
+
+            kill()
+            affected = db.update('test_students', {'height': 171.0}, 'name = %s', ('重连学生',),
+                                 idempotent=True)
+            assert affected == 0 and metrics.reconnects == 2, "幂等写操作断线后应该重试"
+        finally:
+            db.close()
+
+    def test_replicas(self):
+        """测试读写分离"""
+        # MYSQL_REPLICAS 指定副本实例，没有时把主库当成两个没有复制延迟的副本
+        endpoints = load_config().get('replicas') or [self.db.host, self.db.host]
+        router = ReplicaRouter.from_endpoints(endpoints, self.db.user, self.db.password,
+                                              self.db.database, pin_window=60)
+        db = MySQLHelper(self.db.host, self.db.user, self.db.password, self.db.database,
+                         hooks=[], replicas=router)
+        assert db.connect(), "连接失败"
+
+        def replica_reads():
+            return sum(item['reads'] for item in router.stats())
+
+        try:
+            for _ in range(len(endpoints)):
+                db.count('test_students')
+            assert all(item['reads'] == 1 for item in router.stats()), "读查询应该轮流分发到各个副本"
+
+            db.insert('test_students', {'name': '读写分离学生', 'height': 170.0})
+            reads = replica_reads()
+            assert db.count('test_students', 'name = %s', ('读写分离学生',)) >= 1, \
+                "写入后应该能立即读到新数据"
+            assert replica_reads() == reads, "写入后的读查询应该留在主库"
+
+            db._last_write = None
+            router.max_lag = -1
+            router._lag_checked = [None] * len(endpoints)
+            db.count('test_students')
+            assert replica_reads() == reads, "副本延迟过大时应该退回主库"
+        finally:
+            db.delete('test_students', 'name = %s', ('读写分离学生',))
+            db.close()
+            router.close()
+
+    def test_sharding(self):
+        """测试分片表的路由和结果合并"""
+        # 第二个分片放在同一台服务器的 <database>_shard1 库里
+        shard_database = f"{self.db.database}_shard1"
+        self.db.run_sql(f"CREATE DATABASE IF NOT EXISTS {shard_database}", raise_errors=True)
+        config = {'host': self.db.host, 'user': self.db.user, 'password': self.db.password}
+        sharded = ShardedHelper.from_configs(
+            [dict(config, database=self.db.database), dict(config, database=shard_database)],
+            helper_options={'hooks': []})
+        table = 'test_shard_students'
+
+        try:
+            assert sharded.connect(), "所有分片都应该连接成功"
+            for shard in sharded.shards:
+                assert migrate(shard, table), "分片表结构迁移应该成功"
+                shard.delete(table, "1 = 1")
+
+            rows = [{'student_id': i, 'name': f'分片学生{i}', 'height': 150.0 + i * 1.5}
+                    for i in range(1, 21)]
+            assert sharded.insert_many(table, rows)['affected'] == 20, "应该插入20行"
+            assert [shard.count(table) for shard in sharded.shards] == [10, 10], \
+                "按学号取模应该平均分到两个分片"
+
+            student = sharded.get(table, 7)
+            assert student is not None and student[1] == '分片学生7', "按分片键应该能查到单行"
+            assert sharded.shards[1].get_one(table, "student_id = %s", (7,)) is not None, \
+                "奇数学号应该在第二个分片"
+            assert sharded.get(table, '7') == student, "字符串学号应该路由到同一个分片"
+            assert sharded.shard_index(decimal.Decimal(6)) == sharded.shard_index(6), \
+                "Decimal学号应该路由到同一个分片"
+
+            result = sharded.select(table, order_by='height DESC', limit=5)
+            assert [row[0] for row in result['data']] == [20, 19, 18, 17, 16], \
+                "跨分片排序和 limit 应该与单表一致"
+            result = sharded.select(table, "height < %s", (160,), order_by='student_id')
+            assert [row[0] for row in result['data']] == list(range(1, 7)), "条件查询结果应该合并排序"
+
+            assert sharded.count(table) == 20, "总数应该是各分片之和"
+            heights = [row['height'] for row in rows]
+            aggregate = sharded.aggregate(table, 'height')
+            assert aggregate['count'] == 20, "聚合人数不正确"
+            assert abs(float(aggregate['avg']) - sum(heights) / 20) < 0.01, "平均值应该由 SUM/COUNT 合并"
+            assert float(aggregate['min']) == min(heights) and float(aggregate['max']) == max(heights), \
+                "最值合并不正确"
+
+            stats = StatisticsEngine(sharded, table).compute()
+            assert stats.total == 20 and abs(stats.mean - sum(heights) / 20) < 0.01, \
+                "分片统计应该与单表一致"
+
+            result = sharded.update_many(table, [{'student_id': 3, 'height': 199.0},
+                                                 {'student_id': 4, 'height': 198.0},
+                                                 {'student_id': 99, 'height': 180.0}])
+            assert result['outcomes'] == {3: 'updated', 4: 'updated', 99: 'not_found'}, \
+                "批量更新应该路由到各自的分片"
+            result = sharded.delete_many(table, [1, 2, 99])
+            assert result['affected'] == 2 and result['outcomes'][99] == 'not_found', \
+                "批量删除结果不正确"
+            assert sharded.count(table) == 18, "删除后总数不正确"
+
+            try:
+                sharded.insert(table, {'name': '没有学号', 'height': 170.0})
+                raise AssertionError("没有分片键的插入应该被拒绝")
+            except ValueError:
+                pass
+
+            # 一个分片查询失败时不能把它当成空结果合并
+            sharded.shards[1].run_sql(f"ALTER TABLE {table} RENAME TO {table}_moved")
+            try:
+                sharded.count(table)
+                raise AssertionError("分片查询失败时应该抛出ShardQueryError")
+            except ShardQueryError as e:
+                assert e.index == 1, "应该指出失败的分片"
+            finally:
+                sharded.shards[1].run_sql(f"ALTER TABLE {table}_moved RENAME TO {table}")
+
+            # range 分片按学号范围路由，字符串学号与整数分界值比较
+            ranged = ShardedHelper(sharded.shards, strategy='range', bounds=[10])
+            assert ranged.shard_index('42') == ranged.shard_index(42) == 1, \
+                "字符串学号应该按整数落在范围分片中"
+            assert ranged.shard_index('7') == 0, "小于分界值的学号应该在第一个分片"
+            ranged._executor.shutdown()
+        finally:
+            for shard in sharded.shards:
+                shard.run_sql(f"DROP TABLE IF EXISTS {table}")
+            sharded.close()
+
+    def test_write_buffer(self):
+        """测试写缓冲的批量写入、定时写入和出错回调"""
+        where = "name LIKE %s"
+        params = ('写缓冲学生%',)
+        failed = []
+        buffer = WriteBuffer(self.db, 'test_students', max_rows=50, max_delay=0.2,
+                             on_error=lambda row, error: failed.append(row))
+
+        try:
+            started = time.perf_counter()
+            for i in range(120):
+                buffer.insert({'name': f'写缓冲学生{i}', 'height': 160.0 + i % 30})
+            elapsed = time.perf_counter() - started
+            print(f"   120次 insert 共耗时 {elapsed * 1000:.2f}ms")
+
+            assert buffer.flush(timeout=10), "flush 应该在超时前完成"
+            assert self.db.count('test_students', where, params) == 120, "flush 后应该全部写入"
+            assert buffer.stats()['batches'] >= 2, "达到 max_rows 时应该分批写入"
+
+            # 不调用 flush，等待超过 max_delay 后由后台线程写入
+            buffer.insert({'name': '写缓冲学生定时', 'height': 170.0})
+            time.sleep(1)
+            assert self.db.count('test_students', where, params) == 121, "超过 max_delay 应该自动写入"
+
+            buffer.insert({'name': '写缓冲学生好1', 'height': 170.0})
+            buffer.insert({'name': None, 'height': 170.0})
+            buffer.insert({'name': '写缓冲学生好2', 'height': 170.0})
+            buffer.flush()
+            assert len(failed) == 1 and failed[0]['name'] is None, "出错的行应该交给 on_error"
+            assert self.db.count('test_students', where, params) == 123, "同一批的其他行应该正常写入"
+
+            for i in range(10):
+                buffer.insert({'name': f'写缓冲学生关闭{i}', 'height': 175.0})
+            buffer.close()
+            assert self.db.count('test_students', where, params) == 133, "close 前应该写完队列"
+            assert buffer.stats() == {'pending': 0, 'added': 134, 'written': 133,
+                                      'failed': 1, 'batches': buffer.batches}, "统计不正确"
+
+            try:
+                buffer.insert({'name': '写缓冲学生', 'height': 170.0})
+                raise AssertionError("关闭后插入应该报错")
+            except RuntimeError:
+                pass
+        finally:
+            buffer.close()
+            self.db.delete('test_students', where, params)
+
+    def test_roster(self):
+        """测试内存花名册的索引、增量同步和统计"""
+        where = "name LIKE %s"
+        params = ('花名册%',)
+        self.db.delete('test_students', where, params)
+        self.db.insert_many('test_students', [{'name': f'花名册学生{i}', 'height': 150.0 + i}
+                                              for i in range(30)])
+
+        try:
+            roster = StudentRoster(self.db, 'test_students', refresh_interval=3600)
+            assert roster.load() == self.db.count('test_students'), "载入人数应该与表中一致"
+
+            expected = self.db.select('test_students', 'height BETWEEN %s AND %s', (160, 170))
+            assert sorted(s.student_id for s in roster.height_between(160, 170)) == \
+                sorted(row[0] for row in expected['data']), "身高范围结果应该与 SQL 一致"
+            assert len(roster.search_prefix('花名册学生2')) == 11, "姓名前缀查找结果不正确"
+            assert len(roster.search('册学生1')) == 11, "姓名包含查找结果不正确"
+
+            stats = roster.statistics()
+            expected = StatisticsEngine(self.db, 'test_students').compute()
+            assert stats.total == expected.total and abs(stats.mean - expected.mean) < 0.01, \
+                "内存统计应该与数据库统计一致"
+
+            # 本进程的修改直接更新索引
+            student_id = roster.find_name('花名册学生5')[0].student_id
+            self.db.update('test_students', {'height': 199.0}, 'student_id = %s', (student_id,))
+            roster.apply_update(student_id, {'height': 199.0})
+            assert roster.height_between(199, 199)[0].student_id == student_id, "身高索引应该随修改更新"
+            self.db.delete('test_students', 'student_id = %s', (student_id,))
+            roster.apply_delete([student_id])
+            assert roster.get(student_id) is None and not roster.find_name('花名册学生5'), \
+                "删除后索引中不应该再有该学生"
+
+            # 其他连接的新增和修改由 sync() 读入
+            loads = roster.loads
+            self.db.insert('test_students', {'name': '花名册新学生', 'height': 171.0})
+            other_id = roster.find_name('花名册学生6')[0].student_id
+            self.db.update('test_students', {'height': 188.0}, 'student_id = %s', (other_id,))
+            roster.sync()
+            assert roster.loads == loads, "只有新增和修改时不应该重新载入"
+            assert roster.find_name('花名册新学生'), "sync 应该读入其他连接新增的学生"
+            if roster.watermark_column == 'updated_at':
+                assert roster.get(other_id).height == 188.0, "sync 应该读入其他连接的修改"
+
+            # 其他连接的删除通过人数检查发现
+            self.db.delete('test_students', 'name = %s', ('花名册学生7',))
+            roster.sync()
+            assert roster.loads == loads + 1 and not roster.find_name('花名册学生7'), \
+                "人数对不上时应该重新载入"
+
+            roster.refresh_interval = 0
+            syncs = roster.syncs
+            roster.get(other_id)
+            assert roster.syncs == syncs + 1, "超过刷新间隔后查询应该自动同步"
+
+            # 写缓冲后台线程的写入通过 hook 让花名册过期，查询前自动读入
+            roster.refresh_interval = 3600
+            with WriteBuffer(self.db, 'test_students', max_delay=0.01,
+                             hooks=[roster.hook]) as buffer:
+                buffer.insert({'name': '花名册缓冲学生', 'height': 166.0})
+                buffer.flush()
+            assert roster.stale, "写缓冲的写入应该让花名册过期"
+            assert roster.find_name('花名册缓冲学生'), "查询前应该同步写缓冲写入的学生"
+        finally:
+            self.db.delete('test_students', where, params)
+
+    def test_height_index(self):
+        """测试身高索引的范围计数、统计和过期时退回 SQL"""
+        where = "name LIKE %s"
+        params = ('身高索引%',)
+        self.db.delete('test_students', where, params)
+        self.db.insert_many('test_students', [{'name': f'身高索引学生{i}', 'height': 155.5 + i * 0.75}
+                                              for i in range(40)])
+
+        roster = StudentRoster(self.db, 'test_students', refresh_interval=3600, sql_fallback=True)
+        self.db.add_hook(roster.hook)
+        try:
+            roster.load()
+            for low, high in ((160, 170), (160.25, 165.5), (170, 160)):
+                assert roster.count_between(low, high) == self.db.count(
+                    'test_students', 'height BETWEEN %s AND %s', (low, high)), "BETWEEN 计数不正确"
+            assert roster.count_above(170) == self.db.count('test_students', 'height > %s', (170,)), \
+                "大于计数不正确"
+            assert len(roster.height_above(170)) == roster.count_above(170), "大于查询的行数不正确"
+
+            stats = roster.statistics()
+            expected = StatisticsEngine(self.db, 'test_students').compute()
+            assert stats.buckets == expected.buckets, "身高分段人数应该与数据库一致"
+            assert (stats.min, stats.max) == (expected.min, expected.max), "最值不正确"
+            assert abs(stats.mean - expected.mean) < 0.001, "平均值不正确"
+            for p, value in expected.percentiles.items():
+                assert abs(stats.percentiles[p] - value) < 0.001, f"{p}百分位不正确"
+
+            # 经过同一个 helper 的写入让花名册过期，过期时直接查询数据库
+            self.db.update('test_students', {'height': 250.0}, 'name = %s', ('身高索引学生0',))
+            assert roster.stale, "没有 apply 的写入应该让花名册过期"
+            loads, syncs = roster.loads, roster.syncs
+            assert roster.count_above(240) == self.db.count('test_students', 'height > %s', (240,)), \
+                "过期时应该由数据库回答"
+            assert (roster.loads, roster.syncs) == (loads, syncs), "sql_fallback 时不应该同步"
+
+            roster.sync()
+            assert not roster.stale and roster.count_above(240) == \
+                self.db.count('test_students', 'height > %s', (240,)), "同步后索引应该包含新的身高"
+
+            index = HeightIndex()
+            for height in (160.3, 160.3, 170.0):
+                index.add(height)
+            index.remove(160.3)
+            assert index.count_between(160.3, 160.3) == 1 and index.kth(2) == 170.0, \
+                "增删后的索引不正确"
+
+            # DECIMAL(5,2) 的身高可以是负数，索引要覆盖全部取值
+            index = HeightIndex.from_values([-12.5, 0, 999.99, -999.99])
+            assert index.kth(1) == -999.99 and index.kth(4) == 999.99, "最值应该覆盖整个范围"
+            assert index.count_below(0) == 2 and index.count_between(-20, 0) == 2, \
+                "负数身高应该按大小计数"
+            assert abs(index.mean() - (-12.5 / 4)) < 1e-9, "平均值应该包括负数身高"
+        finally:
+            self.db.hooks.remove(roster.hook)
+            self.db.delete('test_students', where, params)
+
+    def test_benchmark(self):
+        """测试压测工具的结果结构和写入行数"""
+        table = 'bench_test_students'
+        benchmark = Benchmark(self.db.host, self.db.user, self.db.password, self.db.database,
+                              table, rows=25, iterations=5, batch_size=10)
+        try:
+            report = benchmark.run(['insert_many'], [1])
+            result = report['results'][0]
+            assert result['calls'] == 3 and result['rows'] == 25, "25行应该分3批写入"
+            assert self.db.count(table) == 25, "最后一批不应该多写入数据"
+
+            report = benchmark.run(ALL_OPERATIONS, [1, 2])
+            assert len(report['results']) == len(ALL_OPERATIONS) * 2, "每个并发度都应该测试所有操作"
+            assert report['config']['rows'] == 25 and 'max_rss_kb' in report, "报告缺少配置或进程内存"
+            for result in report['results']:
+                assert result['errors'] == 0, f"{result['operation']}不应该出错"
+                assert 'max_rss_kb' not in result, "进程内存峰值不能归到单个操作"
+                if result['calls']:
+                    assert set(result['latency_ms']) == {'p50', 'p95', 'p99', 'max', 'mean'}, \
+                        "延迟统计缺少分位数"
+                    assert result['latency_ms']['p50'] <= result['latency_ms']['p99'], \
+                        "p50不应大于p99"
+        finally:
+            self.db.run_sql(f"DROP TABLE IF EXISTS {table}")
+
+    def test_records(self):
+        """测试Student记录和namedtuple行"""
+        raw = self.db.select('test_students', order_by='student_id')
+        result = self.db.select('test_students', order_by='student_id',
+                                row_factory=Student.from_columns)
+        assert result['count'] == raw['count'], "转换前后行数应该一致"
+        for row, student in zip(raw['data'], result['data']):
+            assert student.student_id == row[0], "学号应该匹配"
+            assert student[1] == row[1], "按位置取值应该与原始元组一致"
+            if row[2] is not None:
+                assert student.height == float(row[2]), "身高应该转换为float"
+
+        rows = self.db.select('test_students', row_factory=named_rows)['data']
+        if rows:
+            assert rows[0].name == rows[0][1], "namedtuple行应该可以按列名取值"
+
+        lazy = MySQLHelper(self.db.host, self.db.user, self.db.password, self.db.database,
+                           hooks=[], lazy_decode=True)
+        assert lazy.connect(), "延迟解码连接失败"
+        try:
+            student = lazy.get_one('test_students', 'height IS NOT NULL',
+                                   row_factory=Student.from_columns)
+            if student is not None:
+                assert isinstance(student.height, float), "延迟解码的身高应该在读取时转换为float"
+        finally:
+            lazy.close()
+
     # ---------- E2E测试（端到端测试） ----------
 
     def e2e_test(self):
@@ -201,14 +964,7 @@ class SchoolDBTester:
         # 1. 创建表
         print("\n1. 创建测试表...")
         self.db.run_sql(f"DROP TABLE IF EXISTS {test_table}")
-        create_sql = f"""
-        CREATE TABLE {test_table} (
-            student_id INT PRIMARY KEY AUTO_INCREMENT,
-            name VARCHAR(50) NOT NULL,
-            height DECIMAL(5,2)
-        )
-        """
-        self.db.run_sql(create_sql)
+        assert migrate(self.db, test_table), "创建测试表失败"
 
         # 2. 批量插入数据
         print("2. 批量插入测试数据...")
@@ -219,8 +975,8 @@ class SchoolDBTester:
             {'name': 'E2E学生4', 'height': 158.7}
         ]
 
-        for student in test_students:
-            self.db.insert(test_table, student)
+        result = self.db.insert_many(test_table, test_students)
+        assert result['affected'] == 4, "应该批量插入4行数据"
 
         # 3. 查询验证
         print("3. 查询验证...")
@@ -279,7 +1035,29 @@ class SchoolDBTester:
             (self.test_delete_data, "删除数据"),
             (self.test_get_one, "获取单条数据"),
             (self.test_count, "统计功能"),
-            (self.test_complex_query, "复杂查询")
+            (self.test_complex_query, "复杂查询"),
+            (self.test_insert_many, "批量插入"),
+            (self.test_bulk_update_delete, "批量更新删除"),
+            (self.test_upsert, "插入或更新"),
+            (self.test_stream, "流式查询"),
+            (self.test_transaction, "事务"),
+            (self.test_statistics, "统计引擎"),
+            (self.test_columnar, "列式查询"),
+            (self.test_cache, "查询缓存"),
+            (self.test_instrumentation, "查询监控"),
+            (self.test_pagination, "分页查询"),
+            (self.test_name_search, "姓名查找"),
+            (self.test_pool, "连接池"),
+            (self.test_async, "异步helper"),
+            (self.test_import_export, "导入导出"),
+            (self.test_reconnect, "断线重连"),
+            (self.test_replicas, "读写分离"),
+            (self.test_sharding, "分片"),
+            (self.test_write_buffer, "写缓冲"),
+            (self.test_roster, "内存花名册"),
+            (self.test_height_index, "身高索引"),
+            (self.test_benchmark, "压测工具"),
+            (self.test_records, "记录类型")
         ]
 
         # 运行每个测试用例
@@ -304,6 +1082,28 @@ class SchoolDBTester:
             'getone': self.test_get_one,
             'count': self.test_count,
             'complex': self.test_complex_query,
+            'insertmany': self.test_insert_many,
+            'bulk': self.test_bulk_update_delete,
+            'upsert': self.test_upsert,
+            'stream': self.test_stream,
+            'transaction': self.test_transaction,
+            'statistics': self.test_statistics,
+            'columnar': self.test_columnar,
+            'cache': self.test_cache,
+            'metrics': self.test_instrumentation,
+            'page': self.test_pagination,
+            'namesearch': self.test_name_search,
+            'pool': self.test_pool,
+            'async': self.test_async,
+            'io': self.test_import_export,
+            'reconnect': self.test_reconnect,
+            'replicas': self.test_replicas,
+            'sharding': self.test_sharding,
+            'buffer': self.test_write_buffer,
+            'roster': self.test_roster,
+            'height': self.test_height_index,
+            'bench': self.test_benchmark,
+            'records': self.test_records,
             'e2e': self.e2e_test
         }
 
@@ -344,6 +1144,28 @@ if __name__ == "__main__":
         print("  getone     - 测试获取单条数据")
         print("  count      - 测试统计功能")
         print("  complex    - 测试复杂查询")
+        print("  insertmany - 测试批量插入")
+        print("  bulk       - 测试批量更新删除")
+        print("  upsert     - 测试插入或更新")
+        print("  stream     - 测试流式查询")
+        print("  transaction - 测试事务")
+        print("  statistics - 测试统计引擎")
+        print("  columnar   - 测试列式查询")
+        print("  cache      - 测试查询缓存")
+        print("  metrics    - 测试查询监控")
+        print("  page       - 测试分页查询")
+        print("  namesearch - 测试姓名查找")
+        print("  pool       - 测试连接池")
+        print("  async      - 测试异步helper")
+        print("  io         - 测试导入导出")
+        print("  reconnect  - 测试断线重连")
+        print("  replicas   - 测试读写分离")
+        print("  sharding   - 测试分片")
+        print("  buffer     - 测试写缓冲")
+        print("  roster     - 测试内存花名册")
+        print("  height     - 测试身高索引")
+        print("  bench      - 测试压测工具")
+        print("  records    - 测试记录类型")
         print("  e2e        - 运行E2E端到端测试")
 
         test_name = input("请输入测试用例名称: ").strip().lower()
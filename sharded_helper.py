@@ -0,0 +1,281 @@
+import zlib
+from bisect import bisect_right
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cmp_to_key
+from heapq import merge
+
+from mysql_helper import MySQLHelper, count_sql, normalize_key, select_sql
+
+
+def hash_shard(value, count):
+    # 整数（包括整数形式的字符串和 Decimal）直接取模，其他字符串（例如校区）用 crc32，
+    # 不受 PYTHONHASHSEED 影响
+    value = normalize_key(value)
+    if isinstance(value, int):
+        return value % count
+    return zlib.crc32(str(value).encode('utf-8')) % count
+
+
+def parse_order_by(order_by):
+    # "height DESC, student_id" -> [('height', True), ('student_id', False)]
+    fields = []
+    for part in order_by.split(','):
+        tokens = part.split()
+        if not tokens:
+            continue
+        column = tokens[0].rsplit('.', 1)[-1].strip('`')
+        descending = len(tokens) > 1 and tokens[1].upper() == 'DESC'
+        fields.append((column, descending))
+    return fields
+
+
+def order_key(columns, order_by):
+    """返回按 order_by 比较结果行的 key 函数，NULL 与 MySQL 一样在升序时排在最前"""
+    fields = []
+    for column, descending in parse_order_by(order_by):
+        if column not in columns:
+            raise ValueError(f"跨分片排序的列必须出现在查询结果中: {column}")
+        fields.append((columns.index(column), descending))
+
+    def compare(a, b):
+        for index, descending in fields:
+            x, y = a[index], b[index]
+            if x == y:
+                continue
+            if x is None:
+                result = -1
+            elif y is None:
+                result = 1
+            else:
+                result = -1 if x < y else 1
+            return -result if descending else result
+        return 0
+
+    return cmp_to_key(compare)
+
+
+class ShardQueryError(Exception):
+    """跨分片查询时某个分片失败；只合并其余分片会得到错误的总数，整个查询失败"""
+
+    def __init__(self, index, error):
+        super().__init__(f"分片{index}查询失败: {error}")
+        self.index = index
+        self.error = error
+
+
+class ShardedHelper:
+    """把一张表按分片键拆到多个 MySQLHelper 上
+
+    strategy 为 'hash' 时按分片键取模，为 'range' 时 bounds 是升序的分界值，
+    小于 bounds[0] 的行在第 0 个分片，依此类推，分片数为 len(bounds) + 1。
+    带分片键的单行操作只访问一个分片；select/count/aggregate 在线程池中并发
+    查询所有分片再合并结果。某个分片查询失败时先通过该分片的 hooks 报告，再抛出
+    ShardQueryError，不返回缺了一个分片的结果。
+    """
+
+    def __init__(self, shards, shard_key='student_id', strategy='hash', bounds=None,
+                 max_workers=None):
+        if strategy not in ('hash', 'range'):
+            raise ValueError(f"未知的分片策略: {strategy}")
+        if not shards:
+            raise ValueError("至少需要一个分片")
+        if strategy == 'range':
+            if bounds is None or len(bounds) != len(shards) - 1:
+                raise ValueError("range 分片需要 len(shards) - 1 个分界值")
+            if list(bounds) != sorted(bounds):
+                raise ValueError("分界值必须按升序排列")
+
+        self.shards = list(shards)
+        self.shard_key = shard_key
+        self.strategy = strategy
+        self.bounds = list(bounds) if bounds is not None else None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(self.shards),
+                                            thread_name_prefix='shard')
+
+    @classmethod
+    def from_configs(cls, configs, helper_options=None, **options):
+        """configs 是每个分片的连接参数（host/user/password/database ...）"""
+        shards = [MySQLHelper(**dict(helper_options or {}, **config)) for config in configs]
+        return cls(shards, **options)
+
+    # ---------- 路由 ----------
+
+    def shard_index(self, value):
+        if value is None:
+            raise ValueError(f"分片键 {self.shard_key} 不能为空")
+        # 界面和命令行传入的学号是字符串，与整数分界值比较前先转换
+        value = normalize_key(value)
+        if self.strategy == 'range':
+            return bisect_right(self.bounds, value)
+        return hash_shard(value, len(self.shards))
+
+    def shard_for(self, value):
+        return self.shards[self.shard_index(value)]
+
+    def _fan_out(self, operation):
+        # 每个分片的结果按分片顺序返回
+        return list(self._executor.map(operation, self.shards))
+
+    def _query_all(self, sql, params=None):
+        # 每个分片的查询结果按分片顺序返回，任何一个分片失败都抛出 ShardQueryError
+        def query(index):
+            try:
+                return self.shards[index].get_data(sql, params, raise_errors=True)
+            except Exception as e:
+                raise ShardQueryError(index, e) from e
+
+        return list(self._executor.map(query, range(len(self.shards))))
+
+    def _group(self, items, value_of):
+        groups = defaultdict(list)
+        for item in items:
+            groups[self.shard_index(value_of(item))].append(item)
+        return groups
+
+    def _key_value(self, data):
+        if self.shard_key not in data:
+            raise ValueError(f"写入分片表时必须指定分片键 {self.shard_key}")
+        return data[self.shard_key]
+
+    # ---------- 连接 ----------
+
+    def connect(self):
+        return all(self._fan_out(lambda shard: shard.connect()))
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        self._executor.shutdown(wait=True)
+
+    # ---------- 写入 ----------
+
+    def insert(self, table, data):
+        return self.shard_for(self._key_value(data)).insert(table, data)
+
+    def insert_many(self, table, rows, chunk_size=1000):
+        groups = self._group(rows, self._key_value)
+        results = list(self._executor.map(
+            lambda index: self.shards[index].insert_many(table, groups[index], chunk_size),
+            groups))
+        return {'affected': sum(result['affected'] for result in results),
+                'chunks': [count for result in results for count in result['chunks']]}
+
+    def update(self, table, data, where, where_params=None, shard=None):
+        """shard 是分片键的值，给出时只更新对应分片，否则在所有分片上执行"""
+        if self.shard_key in data:
+            raise ValueError(f"不能修改分片键 {self.shard_key}，请删除后重新插入")
+        if shard is not None:
+            return self.shard_for(shard).update(table, data, where, where_params)
+        return sum(self._fan_out(lambda db: db.update(table, data, where, where_params)))
+
+    def delete(self, table, where, params=None, shard=None):
+        if shard is not None:
+            return self.shard_for(shard).delete(table, where, params)
+        return sum(self._fan_out(lambda db: db.delete(table, where, params)))
+
+    def _merge_outcomes(self, results, hit):
+        # 按分片键以外的列操作时每个分片都会收到全部 id，命中任意一个分片就算命中
+        affected = 0
+        outcomes = {}
+        for result in results:
+            affected += result['affected']
+            for i, outcome in result['outcomes'].items():
+                if outcomes.get(i) != hit:
+                    outcomes[i] = outcome
+        return {'affected': affected, 'outcomes': outcomes}
+
+    def update_many(self, table, rows, key='student_id', chunk_size=500):
+        if key != self.shard_key:
+            rows = list(rows)
+            return self._merge_outcomes(
+                self._fan_out(lambda db: db.update_many(table, rows, key, chunk_size)), 'updated')
+
+        groups = self._group(rows, lambda row: row[key])
+        return self._merge_outcomes(self._executor.map(
+            lambda index: self.shards[index].update_many(table, groups[index], key, chunk_size),
+            groups), 'updated')
+
+    def delete_many(self, table, ids, key='student_id', chunk_size=1000):
+        if key != self.shard_key:
+            ids = list(ids)
+            return self._merge_outcomes(
+                self._fan_out(lambda db: db.delete_many(table, ids, key, chunk_size)), 'deleted')
+
+        groups = self._group(ids, lambda i: i)
+        return self._merge_outcomes(self._executor.map(
+            lambda index: self.shards[index].delete_many(table, groups[index], key, chunk_size),
+            groups), 'deleted')
+
+    # ---------- 查询 ----------
+
+    def get(self, table, value, row_factory=None):
+        """按分片键取一行，只查询一个分片"""
+        return self.shard_for(value).get_one(table, f"{self.shard_key} = %s", (value,),
+                                             row_factory=row_factory)
+
+    def get_data(self, sql, params=None, row_factory=None):
+        """在所有分片上执行同一条查询，按分片顺序拼接结果
+
+        不合并 ORDER BY、LIMIT 和聚合，需要这些语义时用 select / count / aggregate；
+        StatisticsEngine 按值分组的分布可以直接拼接，统计结果与单库一致。
+        """
+        results = self._query_all(sql, params)
+        columns = next((r['columns'] for r in results if r['columns']), ())
+        data = [row for result in results for row in result['data']]
+        return MySQLHelper._make_rows({'columns': columns, 'data': data, 'count': len(data)},
+                                      row_factory)
+
+    def select(self, table, where=None, params=None, order_by=None, limit=None,
+               row_factory=None):
+        """并发查询所有分片，按 order_by 归并各分片已排好序的结果
+
+        limit 下推到每个分片，归并后再截取前 limit 行。字符串列按 Python 的顺序
+        归并，与非二进制排序规则（collation）的顺序可能不同。
+        """
+        sql = select_sql(table, where, order_by)
+        query_params = tuple(params or ())
+        if limit is not None:
+            sql += " LIMIT %s"
+            query_params += (limit,)
+
+        results = self._query_all(sql, query_params)
+        columns = next((r['columns'] for r in results if r['columns']), ())
+        parts = [result['data'] for result in results]
+
+        if order_by and columns:
+            data = list(merge(*parts, key=order_key(columns, order_by)))
+        else:
+            data = [row for part in parts for row in part]
+        if limit is not None:
+            data = data[:limit]
+
+        return MySQLHelper._make_rows({'columns': columns, 'data': data, 'count': len(data)},
+                                      row_factory)
+
+    def count(self, table, where=None, params=None, shard=None):
+        if shard is not None:
+            return self.shard_for(shard).count(table, where, params)
+        results = self._query_all(count_sql(table, where), params)
+        return sum(result['data'][0][0] for result in results)
+
+    def aggregate(self, table, column, where=None, params=None):
+        """返回 count/sum/avg/min/max，平均值由各分片的 SUM 和 COUNT 合并得出"""
+        sql = f"SELECT COUNT({column}), SUM({column}), MIN({column}), MAX({column}) FROM {table}"
+        if where:
+            sql += f" WHERE {where}"
+        rows = [row for result in self._query_all(sql, params) for row in result['data']]
+
+        count = sum(row[0] for row in rows)
+        sums = [row[1] for row in rows if row[1] is not None]
+        minimums = [row[2] for row in rows if row[2] is not None]
+        maximums = [row[3] for row in rows if row[3] is not None]
+        total = sum(sums) if sums else None
+
+        return {
+            'count': count,
+            'sum': total,
+            'avg': total / count if count else None,
+            'min': min(minimums) if minimums else None,
+            'max': max(maximums) if maximums else None
+        }
@@ -0,0 +1,286 @@
+import argparse
+import csv
+import json
+import sys
+
+from benchmark import ALL_OPERATIONS, Benchmark
+from db_config import load_config
+from mysql_helper import MySQLHelper
+from name_search import NameSearch
+from student_io import export_file, import_file, json_default, load_data_infile
+from student_statistics import StatisticsEngine
+
+
+def stderr_hook(event):
+    """命令行模式下标准输出只留给结果，错误信息写到标准错误"""
+    if event.error is not None:
+        print(f"✗ {event.operation} 失败: {event.error}", file=sys.stderr)
+
+
+def stderr_progress(count):
+    print(f"\r已处理 {count} 行", end='', file=sys.stderr, flush=True)
+
+
+def write_rows(columns, batches, output_format, out=None):
+    # 逐批输出，text 为带表头的 TSV，json 为每行一个对象的 JSON-lines
+    out = out or sys.stdout
+    count = 0
+    if output_format == 'json':
+        for batch in batches:
+            for row in batch:
+                out.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False,
+                                     default=json_default) + '\n')
+            count += len(batch)
+    else:
+        writer = csv.writer(out, delimiter='\t', lineterminator='\n')
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows(batch)
+            count += len(batch)
+    return count
+
+
+def write_result(result, output_format, out=None):
+    out = out or sys.stdout
+    if output_format == 'json':
+        out.write(json.dumps(result, ensure_ascii=False, default=json_default) + '\n')
+    else:
+        for key, value in result.items():
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, ensure_ascii=False, default=json_default)
+            out.write(f"{key}: {value}\n")
+
+
+def height_filter(args):
+    conditions = []
+    params = []
+    if args.min_height is not None:
+        conditions.append("height >= %s")
+        params.append(args.min_height)
+    if args.max_height is not None:
+        conditions.append("height <= %s")
+        params.append(args.max_height)
+    return (' AND '.join(conditions) or None), tuple(params)
+
+
+def cmd_add(db, args):
+    if not args.name.strip() or not 0 < args.height <= 300:
+        print("姓名不能为空，身高必须在0-300cm之间", file=sys.stderr)
+        return 1
+    affected = db.insert(args.table, {'name': args.name.strip(), 'height': args.height})
+    write_result({'added': affected}, args.format)
+    return 0 if affected else 1
+
+
+def cmd_list(db, args):
+    where, params = height_filter(args)
+    with db.select_stream(args.table, where, params, args.order_by, batch_size=1000) as stream:
+        if stream.description is None:
+            return 1
+        write_rows(stream.columns, stream, args.format)
+    return 0
+
+
+def cmd_search(db, args):
+    if args.keyword:
+        search = NameSearch(db, args.table, index_name=f"ft_{args.table}_name")
+        result = search.search_prefix(args.keyword) if args.prefix else search.search(args.keyword)
+    else:
+        where, params = height_filter(args)
+        if where is None:
+            print("请指定姓名关键词或身高范围", file=sys.stderr)
+            return 1
+        result = db.select(args.table, where, params, order_by='height')
+    write_rows(result['columns'], [result['data']], args.format)
+    return 0
+
+
+def cmd_update(db, args):
+    data = {}
+    if args.name is not None:
+        data['name'] = args.name
+    if args.height is not None:
+        data['height'] = args.height
+    if not data:
+        print("没有要更新的内容，请指定 --name 或 --height", file=sys.stderr)
+        return 1
+
+    result = db.update_many(args.table, [dict(data, student_id=args.student_id)])
+    outcome = result['outcomes'].get(args.student_id, 'error')
+    write_result({'student_id': args.student_id, 'outcome': outcome}, args.format)
+    return 0 if outcome == 'updated' else 1
+
+
+def cmd_delete(db, args):
+    result = db.delete_many(args.table, args.student_ids)
+    if not result['outcomes']:
+        return 1
+    write_result({'deleted': result['affected'],
+                  'outcomes': {str(i): outcome for i, outcome in result['outcomes'].items()}},
+                 args.format)
+    return 0
+
+
+def cmd_stats(db, args):
+    stats = StatisticsEngine(db, table=args.table).compute()
+    write_result(stats.to_dict(), args.format)
+    return 0
+
+
+def cmd_import(db, args):
+    progress = stderr_progress if args.progress else None
+    if args.load_data:
+        affected = load_data_infile(db, args.path, args.table)
+        write_result({'imported': affected}, args.format)
+        return 0
+
+    result = import_file(db, args.path, args.table, args.file_format, args.chunk_size,
+                         restart=args.restart, progress=progress)
+    if progress:
+        print(file=sys.stderr)
+    write_result(result, args.format)
+    return 0
+
+
+def cmd_export(db, args):
+    progress = stderr_progress if args.progress else None
+    count = export_file(db, args.path, args.table, args.file_format,
+                        batch_size=args.batch_size, progress=progress)
+    if progress:
+        print(file=sys.stderr)
+    write_result({'exported': count, 'path': args.path}, args.format)
+    return 0
+
+
+def cmd_bench(config, args):
+    benchmark = Benchmark(config['host'], config['user'], config['password'], config['database'],
+                          args.bench_table, args.rows, args.iterations, args.batch_size)
+    report = benchmark.run(args.ops, args.concurrency)
+    write_result(report, 'json')
+    return 0
+
+
+def cmd_test(config, args):
+    from school_db_tester import SchoolDBTester
+
+    tester = SchoolDBTester(**config)
+    if args.name:
+        tester.run_specific_test(args.name)
+    else:
+        tester.run_all_tests()
+    return 1 if tester.test_failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="学生管理命令行工具，连接信息依次来自默认值、配置文件、MYSQL_* 环境变量和命令行参数")
+    parser.add_argument('--config', help="INI 配置文件，连接信息写在 [mysql] 段")
+    parser.add_argument('--host')
+    parser.add_argument('--user')
+    parser.add_argument('--password')
+    parser.add_argument('--database')
+    parser.add_argument('--replicas', help="只读副本，逗号分隔的 host[:port]")
+    parser.add_argument('--table', default='students')
+    format_help = "text 输出 TSV / key: value，json 输出 JSON 或 JSON-lines"
+    parser.add_argument('--format', choices=['text', 'json'], default='text', help=format_help)
+    # 子命令之后也可以写 --format；SUPPRESS 使没有写时不覆盖子命令之前的值
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument('--format', choices=['text', 'json'], default=argparse.SUPPRESS,
+                        help=format_help)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', parents=[output], help="添加学生")
+    add.add_argument('name')
+    add.add_argument('height', type=float)
+
+    listing = commands.add_parser('list', parents=[output], help="按顺序输出全部学生")
+    listing.add_argument('--min-height', type=float)
+    listing.add_argument('--max-height', type=float)
+    listing.add_argument('--order-by', default='student_id')
+
+    search = commands.add_parser('search', parents=[output], help="按姓名或身高范围查找")
+    search.add_argument('keyword', nargs='?')
+    search.add_argument('--prefix', action='store_true', help="只匹配姓名开头")
+    search.add_argument('--min-height', type=float)
+    search.add_argument('--max-height', type=float)
+
+    update = commands.add_parser('update', parents=[output], help="更新学生信息")
+    update.add_argument('student_id', type=int)
+    update.add_argument('--name')
+    update.add_argument('--height', type=float)
+
+    delete = commands.add_parser('delete', parents=[output], help="按学号删除一名或多名学生")
+    delete.add_argument('student_ids', type=int, nargs='+')
+
+    commands.add_parser('stats', parents=[output], help="身高统计")
+
+    importing = commands.add_parser('import', parents=[output], help="从 CSV / JSON-lines 文件导入")
+    importing.add_argument('path')
+    importing.add_argument('--file-format', choices=['csv', 'jsonl'])
+    importing.add_argument('--chunk-size', type=int, default=5000)
+    importing.add_argument('--restart', action='store_true', help="忽略断点从头导入")
+    importing.add_argument('--load-data', action='store_true', help="使用 LOAD DATA LOCAL INFILE")
+    importing.add_argument('--progress', action='store_true', help="在标准错误输出进度")
+
+    exporting = commands.add_parser('export', parents=[output], help="导出到 CSV / JSON-lines 文件")
+    exporting.add_argument('path')
+    exporting.add_argument('--file-format', choices=['csv', 'jsonl'])
+    exporting.add_argument('--batch-size', type=int, default=5000)
+    exporting.add_argument('--progress', action='store_true', help="在标准错误输出进度")
+
+    bench = commands.add_parser('bench', help="CRUD 压测，输出 JSON 报告")
+    bench.add_argument('--bench-table', default='bench_students')
+    bench.add_argument('--rows', type=int, default=1000)
+    bench.add_argument('--iterations', type=int, default=1000)
+    bench.add_argument('--batch-size', type=int, default=1000)
+    bench.add_argument('--concurrency', type=int, nargs='+', default=[1])
+    bench.add_argument('--ops', nargs='+', choices=ALL_OPERATIONS, default=ALL_OPERATIONS)
+
+    test = commands.add_parser('test', help="运行 SchoolDBTester 测试")
+    test.add_argument('name', nargs='?', help="测试用例名称，不指定时运行全部")
+
+    return parser
+
+
+COMMANDS = {
+    'add': cmd_add,
+    'list': cmd_list,
+    'search': cmd_search,
+    'update': cmd_update,
+    'delete': cmd_delete,
+    'stats': cmd_stats,
+    'import': cmd_import,
+    'export': cmd_export
+}
+
+
+def main(argv=None):
+    """返回进程退出码：0 成功，1 操作失败，2 参数错误"""
+    args = build_parser().parse_args(argv)
+    try:
+        replicas = args.replicas.split(',') if args.replicas else None
+        config = load_config(args.config, host=args.host, user=args.user,
+                             password=args.password, database=args.database, replicas=replicas)
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    if args.command == 'bench':
+        return cmd_bench(config, args)
+    if args.command == 'test':
+        return cmd_test(config, args)
+
+    db = MySQLHelper(**config, hooks=[stderr_hook])
+    if not db.connect():
+        return 1
+    try:
+        return COMMANDS[args.command](db, args)
+    except Exception as e:
+        print(f"✗ {args.command} 失败: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
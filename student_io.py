@@ -0,0 +1,255 @@
+import csv
+import datetime
+import decimal
+import hashlib
+import json
+import os
+import time
+
+import pymysql
+
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'jsonl'}
+
+IMPORT_COLUMNS = ('name', 'height')
+
+
+def detect_format(path, format=None):
+    if format:
+        if format not in ('csv', 'jsonl'):
+            raise ValueError(f"不支持的文件格式: {format}")
+        return format
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix not in FORMATS:
+        raise ValueError(f"无法根据扩展名判断文件格式: {path}")
+    return FORMATS[suffix]
+
+
+def console_progress(count):
+    print(f"\r已处理 {count} 行", end='', flush=True)
+
+
+def read_records(path, format=None):
+    """逐行读取 CSV 或 JSON-lines 文件，每次只在内存里保留一行"""
+    format = detect_format(path, format)
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if format == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def clean_record(record, columns=IMPORT_COLUMNS, required=('name',)):
+    # CSV 中的空字符串按 NULL 处理，缺少必填列的行返回 None
+    row = {}
+    for column in columns:
+        value = record.get(column)
+        row[column] = None if value == '' else value
+    if any(row.get(column) is None for column in required):
+        return None
+    return row
+
+
+def json_default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return str(value)
+
+
+def ensure_checkpoint_table(db):
+    db.run_sql("""
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            table_name VARCHAR(64) NOT NULL,
+            source VARCHAR(255) NOT NULL,
+            rows_done BIGINT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, source)
+        )
+    """, raise_errors=True)
+
+
+def checkpoint_source(path):
+    # 断点按文件身份记录：同一路径重新生成的文件大小或修改时间不同，不会沿用旧断点；
+    # 长路径会超过列宽，只保存摘要
+    stat = os.stat(path)
+    identity = f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+
+def read_checkpoint(db, table, source):
+    result = db.get_data("SELECT rows_done FROM import_checkpoints "
+                         "WHERE table_name = %s AND source = %s", (table, source))
+    return result['data'][0][0] if result['data'] else 0
+
+
+def _save_checkpoint(db, table, source, rows_done):
+    db.run_sql("DELETE FROM import_checkpoints WHERE table_name = %s AND source = %s",
+               (table, source))
+    db.run_sql("INSERT INTO import_checkpoints (table_name, source, rows_done) VALUES (%s, %s, %s)",
+               (table, source, rows_done))
+
+
+def _clear_checkpoint(db, table, source):
+    db.run_sql("DELETE FROM import_checkpoints WHERE table_name = %s AND source = %s",
+               (table, source))
+
+
+def import_file(db, path, table='students', format=None, chunk_size=5000, columns=IMPORT_COLUMNS,
+                required=('name',), restart=False, progress=None):
+    """把 CSV / JSON-lines 文件分块导入表中，返回导入结果
+
+    每块的 INSERT 和断点记录在同一个事务里提交，中断后再次导入同一个文件会从
+    上次提交的位置继续；文件被修改或重新生成后从头导入，全部导入完成后删除断点。
+    restart=True 时忽略断点从头导入。
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size必须大于0")
+
+    source = checkpoint_source(path)
+    started = time.perf_counter()
+    ensure_checkpoint_table(db)
+    done = 0 if restart else read_checkpoint(db, table, source)
+    resumed_from = done
+
+    imported = rejected = 0
+    rejected_lines = []
+    chunk = []
+    position = 0
+
+    def flush():
+        nonlocal imported, chunk
+        with db.transaction():
+            if chunk:
+                db.insert_many(table, chunk, chunk_size)
+            _save_checkpoint(db, table, source, position)
+        imported += len(chunk)
+        chunk = []
+        if progress:
+            progress(position)
+
+    for position, record in enumerate(read_records(path, format), 1):
+        # 已经提交过的行只读取不写入
+        if position <= done:
+            continue
+        row = clean_record(record, columns, required)
+        if row is None:
+            rejected += 1
+            if len(rejected_lines) < 10:
+                rejected_lines.append(position)
+        else:
+            chunk.append(row)
+        if position - done >= chunk_size:
+            flush()
+            done = position
+
+    if position > done:
+        flush()
+    _clear_checkpoint(db, table, source)
+
+    return {
+        'imported': imported,
+        'rejected': rejected,
+        'rejected_rows': rejected_lines,
+        'resumed_from': resumed_from,
+        'total': position,
+        'seconds': time.perf_counter() - started
+    }
+
+
+def read_csv_header(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return [name.strip() for name in next(csv.reader(f), [])]
+
+
+def load_data_sql(table, header, columns=IMPORT_COLUMNS, required=('name',)):
+    """按 CSV 表头生成 LOAD DATA 语句，与 import_file 一样按列名而不是位置对应
+
+    表头中不需要导入的列读入 @dummy；空字符串与 clean_record 一样按 NULL 处理。
+    """
+    missing = [column for column in required if column not in header]
+    if missing:
+        raise ValueError(f"文件缺少必填列: {', '.join(missing)}")
+
+    fields = []
+    assignments = []
+    for position, name in enumerate(header):
+        if name in columns and name not in header[:position]:
+            fields.append(f"@c{position}")
+            assignments.append(f"{name} = NULLIF(@c{position}, '')")
+        else:
+            fields.append('@dummy')
+
+    sql = (f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4 "
+           f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+           f"LINES TERMINATED BY '\\n' IGNORE 1 LINES ({', '.join(fields)})")
+    if assignments:
+        sql += f" SET {', '.join(assignments)}"
+    return sql
+
+
+def load_data_infile(db, path, table='students', columns=IMPORT_COLUMNS, required=('name',)):
+    """用 LOAD DATA LOCAL INFILE 导入带表头的 CSV，由服务器直接解析文件
+
+    columns 是要导入的列，按表头中的列名对应，export_file 导出的文件可以直接导入。
+    速度最快，但需要服务器开启 local_infile，且整个文件是一条语句，不支持断点续传。
+    """
+    sql = load_data_sql(table, read_csv_header(path), columns, required)
+    conn = pymysql.connect(host=db.host, user=db.user, password=db.password,
+                           database=db.database, charset='utf8mb4', local_infile=True)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, (os.path.abspath(path),))
+            affected = cursor.rowcount
+        conn.commit()
+    finally:
+        conn.close()
+
+    if db.cache is not None:
+        db.cache.invalidate(table)
+    return affected
+
+
+def export_file(db, path, table='students', format=None, where=None, params=None,
+                order_by='student_id', batch_size=5000, progress=None):
+    """用服务器端游标分批读取并写入 CSV / JSON-lines 文件，返回导出的行数
+
+    先写到临时文件，全部完成后再替换目标文件，中途失败不会留下半个文件。
+    """
+    format = detect_format(path, format)
+    temp_path = path + '.tmp'
+    count = 0
+
+    try:
+        with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+            with db.select_stream(table, where, params, order_by, batch_size) as stream:
+                if stream.description is None:
+                    raise Exception(f"查询{table}失败，未导出任何数据")
+                if format == 'csv':
+                    writer = csv.writer(f, lineterminator='\n')
+                    writer.writerow(stream.columns)
+                for batch in stream:
+                    if format == 'csv':
+                        writer.writerows(batch)
+                    else:
+                        for row in batch:
+                            f.write(json.dumps(dict(zip(stream.columns, row)),
+                                               ensure_ascii=False, default=json_default))
+                            f.write('\n')
+                    count += len(batch)
+                    if progress:
+                        progress(count)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return count
@@ -1,4 +1,7 @@
+from db_config import load_config
 from mysql_helper import MySQLHelper
+from student_roster import StudentRoster
+from student_schema import migrate
 
 
 def test_school_system():
@@ -6,17 +9,16 @@ def test_school_system():
     print("学校学生管理系统测试")
     print("=" * 60)
 
-    db = MySQLHelper(
-        host='localhost',
-        user='root',
-        password='123456',
-        database='school_db'
-    )
+    db = MySQLHelper(**load_config())
 
     if not db.connect():
         print("连接失败")
         return
 
+    # 身高范围和统计由内存花名册回答，经过 db 的写入会让它在下次查询前同步
+    roster = StudentRoster(db)
+    db.add_hook(roster.hook)
+
     print("\n初始学生数据...")
     result = db.select('students')
     show_students(result)
@@ -28,8 +30,8 @@ def test_school_system():
         {'name': '小乔', 'height': 162.8}
     ]
 
+    db.insert_many('students', new_students)
     for student in new_students:
-        db.insert('students', student)
         print(f"添加：{student['name']} - {student['height']}cm")
 
     print("\n查询所有学生...")
@@ -37,11 +39,11 @@ def test_school_system():
     show_students(result)
 
     print("\n条件查询：身高>170cm的学生...")
-    tall_students = db.select('students', 'height > %s', (170,))
-    if tall_students['count'] > 0:
+    tall_students = roster.height_above(170)
+    if tall_students:
         print("身高超过170cm的学生：")
-        for row in tall_students['data']:
-            print(f"{row[1]} - {row[2]}cm")
+        for student in tall_students:
+            print(f"{student.name} - {student.height}cm")
 
     print("\n查询指定列（学号和姓名）...")
     sql = "SELECT student_id, name FROM students"
@@ -81,39 +83,20 @@ def test_school_system():
     show_students(result)
 
     print("\n统计信息...")
-    total = db.count('students')
-    avg_result = db.get_data("SELECT AVG(height) as avg_height FROM students")
-    max_result = db.get_data("SELECT MAX(height) as max_height FROM students")
-    min_result = db.get_data("SELECT MIN(height) as min_height FROM students")
-
-    if total > 0:
-        avg_height = avg_result['data'][0][0] if avg_result['data'][0][0] else 0
-        max_height = max_result['data'][0][0] if max_result['data'][0][0] else 0
-        min_height = min_result['data'][0][0] if min_result['data'][0][0] else 0
+    stats = roster.statistics()
 
-        print(f"总人数：{total}人")
-        print(f"平均身高：{float(avg_height):.2f}cm")
-        print(f"最高身高：{float(max_height):.2f}cm")
-        print(f"最低身高：{float(min_height):.2f}cm")
+    if stats.total > 0:
+        print(f"总人数：{stats.total}人")
+        print(f"平均身高：{stats.mean or 0:.2f}cm")
+        print(f"最高身高：{stats.max or 0:.2f}cm")
+        print(f"最低身高：{stats.min or 0:.2f}cm")
 
     print("\n分身高段统计...")
-    height_groups = db.get_data("""
-                                SELECT CASE
-                                           WHEN height < 160 THEN '160cm以下'
-                                           WHEN height BETWEEN 160 AND 170 THEN '160-170cm'
-                                           WHEN height BETWEEN 170 AND 180 THEN '170-180cm'
-                                           ELSE '180cm以上'
-                                           END AS height_group,
-                                       COUNT(*) as count
-                                FROM students
-                                GROUP BY height_group
-                                ORDER BY height_group
-                                """)
-
-    if height_groups['data']:
+    if stats.total > 0:
         print("身高分布：")
-        for row in height_groups['data']:
-            print(f"{row[0]}: {row[1]}人")
+        for bucket in stats.buckets:
+            if bucket['count'] > 0:
+                print(f"{bucket['label']}: {bucket['count']}人")
 
     print("\n关闭数据库连接...")
     db.close()
@@ -136,28 +119,26 @@ def show_students(result):
 def check_database():
     print("检查数据库状态...")
 
-    db = MySQLHelper(
-        host='localhost',
-        user='root',
-        password='123456'
-    )
+    config = load_config()
+    database = config['database']
+    db = MySQLHelper(config['host'], config['user'], config['password'])
 
     try:
         import pymysql
         conn = pymysql.connect(
-            host='localhost',
-            user='root',
-            password='123456',
+            host=config['host'],
+            user=config['user'],
+            password=config['password'],
             charset='utf8mb4'
         )
 
         cursor = conn.cursor()
 
-        cursor.execute("SHOW DATABASES LIKE 'school_db'")
+        cursor.execute("SHOW DATABASES LIKE %s", (database,))
         if cursor.fetchone():
-            print("数据库 school_db 存在")
+            print(f"数据库 {database} 存在")
 
-            cursor.execute("USE school_db")
+            cursor.execute(f"USE `{database}`")
 
             cursor.execute("SHOW TABLES LIKE 'students'")
             if cursor.fetchone():
@@ -171,7 +152,7 @@ def check_database():
             else:
                 print("表 students 不存在")
         else:
-            print("数据库 school_db 不存在")
+            print(f"数据库 {database} 不存在")
 
         cursor.close()
         conn.close()
@@ -183,49 +164,32 @@ def check_database():
 def create_database_and_table():
     print("创建数据库和表...")
 
-    db = MySQLHelper(
-        host='localhost',
-        user='root',
-        password='123456'
-    )
+    # 与 test_school_system 使用同一个库，MYSQL_DATABASE 等配置同样生效
+    config = load_config()
+    database = config['database']
+    db = MySQLHelper(config['host'], config['user'], config['password'])
 
     try:
         import pymysql
         conn = pymysql.connect(
-            host='localhost',
-            user='root',
-            password='123456',
+            host=config['host'],
+            user=config['user'],
+            password=config['password'],
             charset='utf8mb4'
         )
 
         cursor = conn.cursor()
 
-        cursor.execute("CREATE DATABASE IF NOT EXISTS school_db")
-        print("数据库 school_db 创建成功")
-
-        cursor.execute("USE school_db")
-
-        create_table_sql = """
-                           CREATE TABLE IF NOT EXISTS students \
-                           ( \
-                               student_id \
-                               INT \
-                               PRIMARY \
-                               KEY \
-                               AUTO_INCREMENT, \
-                               name \
-                               VARCHAR \
-                           ( \
-                               50 \
-                           ) NOT NULL,
-                               height DECIMAL \
-                           ( \
-                               5, \
-                               2 \
-                           )
-                               ) \
-                           """
-        cursor.execute(create_table_sql)
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+        print(f"数据库 {database} 创建成功")
+
+        cursor.execute(f"USE `{database}`")
+
+        # 表结构和索引统一由 student_schema 的迁移维护
+        db.database = database
+        if not db.connect() or not migrate(db):
+            raise Exception("表结构迁移失败")
+        db.close()
         print("表 students 创建成功")
 
         cursor.execute("TRUNCATE TABLE students")
@@ -1,20 +1,37 @@
+from db_config import load_config
 from mysql_helper import MySQLHelper
+from name_search import NameSearch
+from student_io import console_progress, export_file, import_file
+from student_records import Student
+from student_roster import StudentRoster
+from student_schema import migrate
+from student_statistics import DEFAULT_HEIGHT_RANGES, StatisticsEngine
+from write_buffer import WriteBuffer
 
 
 class StudentManager:
     """学生管理系统类"""
 
-    def __init__(self):
+    def __init__(self, height_ranges=None, page_size=20, write_behind=False, roster=False):
         self.db = self.connect_database()
+        self.page_size = page_size
+        self.name_search = NameSearch(self.db) if self.db else None
+        # roster=True 时列表、查找和统计由内存花名册回答，不再每次查询数据库
+        self.roster = StudentRoster(self.db) if roster and self.db else None
+        if self.roster:
+            self.db.add_hook(self.roster.hook)
+        # write_behind=True 时添加学生先进入写缓冲，由后台线程批量写入；
+        # 后台线程的写入同样让花名册过期，下次查询前自动同步
+        self.buffer = None
+        if write_behind and self.db:
+            self.buffer = WriteBuffer(self.db, 'students',
+                                      hooks=[self.roster.hook] if self.roster else None)
+        # 身高分布区间 (最低, 最高, 名称)，左闭右开
+        self.height_ranges = height_ranges or DEFAULT_HEIGHT_RANGES
 
     def connect_database(self):
         """连接数据库"""
-        db = MySQLHelper(
-            host='localhost',
-            user='root',
-            password='123456',
-            database='school_db'
-        )
+        db = MySQLHelper(**load_config())
 
         if db.connect():
             print("✅ 数据库连接成功")
@@ -28,29 +45,16 @@ class StudentManager:
         if not self.db:
             return False
 
-        create_sql = """
-                     CREATE TABLE IF NOT EXISTS students \
-                     ( \
-                         student_id \
-                         INT \
-                         PRIMARY \
-                         KEY \
-                         AUTO_INCREMENT, \
-                         name \
-                         VARCHAR \
-                     ( \
-                         50 \
-                     ) NOT NULL,
-                         height DECIMAL \
-                     ( \
-                         5, \
-                         2 \
-                     ),
-                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                         ) \
-                     """
-
-        return self.db.run_sql(create_sql) >= 0
+        if not migrate(self.db):
+            return False
+
+        if self.roster:
+            print(f"✅ 花名册已载入{self.roster.load()}名学生")
+
+        # 姓名全文索引是可选迁移，不可用时查找会退回 LIKE
+        if not self.name_search.has_fulltext_index():
+            print("⚠️ 姓名全文索引不可用，按姓名查找将使用全表扫描")
+        return True
 
     def add_student(self):
         """添加学生"""
@@ -74,8 +78,13 @@ class StudentManager:
 
         data = {'name': name, 'height': height}
 
-        if self.db.insert('students', data):
+        if self.buffer:
+            self.buffer.insert(data)
+            print(f"✅ 学生 {name} 已加入写入队列")
+        elif self.db.insert('students', data):
             print(f"✅ 学生 {name} 添加成功")
+            if self.roster:
+                self.roster.sync()
         else:
             print("❌ 添加失败")
 
@@ -86,25 +95,58 @@ class StudentManager:
         print("=" * 40)
 
         if students is None:
-            result = self.db.select('students', order_by='student_id')
-            students = result['data']
+            self.show_student_pages()
+            return
 
         if not students:
             print("暂无学生数据")
             return
 
         print(f"共找到 {len(students)} 名学生")
-        print("-" * 40)
-        print(f"{'学号':<8} {'姓名':<15} {'身高':<10} {'添加时间':<20}")
-        print("-" * 40)
+        self.print_students(students)
+
+    def show_student_pages(self):
+        """按学号分页显示全部学生，每页单独查询"""
+        shown = 0
+        page_no = 0
+        if self.roster:
+            pages = self.roster.iter_pages(self.page_size)
+        else:
+            pages = self.db.iter_pages('students', self.page_size, row_factory=Student.from_columns)
+        for page in pages:
+            page_no += 1
+            shown += self.print_students(page['data'])
+            if page['next_token'] is None:
+                break
+            choice = input(f"\n第{page_no}页，回车查看下一页，输入q返回: ").strip().lower()
+            if choice == 'q':
+                break
+
+        if shown == 0:
+            print("暂无学生数据")
+        else:
+            print("-" * 40)
+            print(f"已显示 {shown} 名学生")
 
+    def print_students(self, students):
+        """逐行输出学生表格，返回输出的行数"""
+        count = 0
         for student in students:
+            if count == 0:
+                print("-" * 40)
+                print(f"{'学号':<8} {'姓名':<15} {'身高':<10} {'添加时间':<20}")
+                print("-" * 40)
+            count += 1
+
+            # 分页查询返回 Student，其他查询返回原始元组，两者都可以按位置取值
             student_id = student[0]
             name = student[1]
             height = student[2]
-            created_at = student[3] if len(student) > 3 else "N/A"
+            created_at = student[3] if len(student) > 3 and student[3] is not None else "N/A"
+
+            print(f"{student_id:<8} {name:<15} {height:<10} {str(created_at):<20}")
 
-            print(f"{student_id:<8} {name:<15} {height:<10} {created_at:<20}")
+        return count
 
     def search_student(self):
         """查找学生"""
@@ -123,8 +165,10 @@ class StudentManager:
                 print("请输入搜索关键词")
                 return
 
-            result = self.db.select('students', 'name LIKE %s', (f'%{keyword}%',))
-            self.show_students(result['data'])
+            if self.roster:
+                self.show_students(self.roster.search(keyword))
+            else:
+                self.show_students(self.name_search.search(keyword)['data'])
 
         elif choice == '2':
             try:
@@ -135,10 +179,13 @@ class StudentManager:
                     print("最低身高不能大于最高身高")
                     return
 
-                result = self.db.select('students',
-                                        'height BETWEEN %s AND %s',
-                                        (min_height, max_height))
-                self.show_students(result['data'])
+                if self.roster:
+                    self.show_students(self.roster.height_between(min_height, max_height))
+                else:
+                    result = self.db.select('students',
+                                            'height BETWEEN %s AND %s',
+                                            (min_height, max_height))
+                    self.show_students(result['data'])
 
             except ValueError:
                 print("请输入有效的数字")
@@ -148,6 +195,11 @@ class StudentManager:
         else:
             print("无效的选择")
 
+    def find_student(self, student_id):
+        if self.roster:
+            return self.roster.get(student_id)
+        return self.db.get_one('students', 'student_id = %s', (student_id,))
+
     def update_student(self):
         """更新学生信息"""
         print("\n" + "=" * 40)
@@ -159,7 +211,7 @@ class StudentManager:
             print("学号必须是数字")
             return
 
-        student = self.db.get_one('students', 'student_id = %s', (student_id,))
+        student = self.find_student(int(student_id))
         if not student:
             print("该学号不存在")
             return
@@ -191,8 +243,11 @@ class StudentManager:
             print("没有要更新的内容")
             return
 
-        if self.db.update('students', data, 'student_id = %s', (student_id,)):
+        # 按主键写入固定值，断线重连后重复执行结果相同
+        if self.db.update('students', data, 'student_id = %s', (student_id,), idempotent=True):
             print("✅ 更新成功")
+            if self.roster:
+                self.roster.apply_update(int(student_id), data)
         else:
             print("❌ 更新失败")
 
@@ -202,12 +257,18 @@ class StudentManager:
         print("删除学生")
         print("=" * 40)
 
-        student_id = input("请输入学号: ").strip()
-        if not student_id.isdigit():
+        text = input("请输入学号 (多个学号用逗号分隔): ").strip()
+        ids = [part.strip() for part in text.split(',') if part.strip()]
+        if not ids or not all(part.isdigit() for part in ids):
             print("学号必须是数字")
             return
 
-        student = self.db.get_one('students', 'student_id = %s', (student_id,))
+        if len(ids) > 1:
+            self.delete_students([int(part) for part in ids])
+            return
+
+        student_id = ids[0]
+        student = self.find_student(int(student_id))
         if not student:
             print("该学号不存在")
             return
@@ -219,55 +280,110 @@ class StudentManager:
 
         confirm = input("\n确认删除吗？(y/n): ").strip().lower()
         if confirm == 'y' or confirm == 'yes':
-            if self.db.delete('students', 'student_id = %s', (student_id,)):
+            if self.db.delete('students', 'student_id = %s', (student_id,), idempotent=True):
                 print("✅ 删除成功")
+                if self.roster:
+                    self.roster.apply_delete([int(student_id)])
             else:
                 print("❌ 删除失败")
         else:
             print("取消删除")
 
+    def delete_students(self, ids):
+        """一次删除多名学生，逐个报告结果"""
+        confirm = input(f"\n确认删除这{len(ids)}名学生吗？(y/n): ").strip().lower()
+        if confirm not in ('y', 'yes'):
+            print("取消删除")
+            return
+
+        # 每批一条锁定查询和一条 DELETE ... IN，不再逐个查询后删除
+        result = self.db.delete_many('students', ids)
+        if not result['outcomes']:
+            print("❌ 删除失败")
+            return
+
+        if self.roster:
+            self.roster.apply_delete([i for i, outcome in result['outcomes'].items()
+                                      if outcome == 'deleted'])
+        missing = [i for i, outcome in result['outcomes'].items() if outcome == 'not_found']
+        print(f"✅ 删除了{result['affected']}名学生")
+        if missing:
+            print(f"以下学号不存在: {', '.join(map(str, missing))}")
+
     def show_statistics(self):
         """显示统计信息"""
         print("\n" + "=" * 40)
         print("统计信息")
         print("=" * 40)
 
-        # 总人数
-        total = self.db.count('students')
-        if total == 0:
+        # 一次查询拿到总数、均值、最值和分布，启用花名册时在内存中计算
+        if self.roster:
+            stats = self.roster.statistics(self.height_ranges)
+        else:
+            stats = StatisticsEngine(self.db, ranges=self.height_ranges).compute()
+        if stats.total == 0:
             print("暂无学生数据")
             return
 
-        print(f"总人数: {total}人")
-
-        # 平均身高
-        result = self.db.get_data("SELECT AVG(height) FROM students")
-        avg_height = result['data'][0][0] if result['data'][0][0] else 0
-        print(f"平均身高: {float(avg_height):.2f}cm")
-
-        # 最高和最矮
-        result = self.db.get_data("SELECT MAX(height), MIN(height) FROM students")
-        max_height = result['data'][0][0] if result['data'][0][0] else 0
-        min_height = result['data'][0][1] if result['data'][0][1] else 0
-        print(f"最高身高: {float(max_height):.2f}cm")
-        print(f"最低身高: {float(min_height):.2f}cm")
+        print(f"总人数: {stats.total}人")
+        print(f"平均身高: {stats.mean or 0:.2f}cm")
+        print(f"最高身高: {stats.max or 0:.2f}cm")
+        print(f"最低身高: {stats.min or 0:.2f}cm")
+        if 50 in stats.percentiles:
+            print(f"身高中位数: {stats.percentiles[50]:.2f}cm")
 
         # 身高分布
         print("\n身高分布:")
-        height_ranges = [
-            (0, 160, "160cm以下"),
-            (160, 170, "160-170cm"),
-            (170, 180, "170-180cm"),
-            (180, 300, "180cm以上")
-        ]
+        for bucket in stats.buckets:
+            if bucket['count'] > 0:
+                percentage = stats.percentage(bucket['count'])
+                print(f"  {bucket['label']}: {bucket['count']}人 ({percentage:.1f}%)")
 
-        for min_h, max_h, label in height_ranges:
-            count = self.db.count('students',
-                                  'height >= %s AND height < %s',
-                                  (min_h, max_h))
-            if count > 0:
-                percentage = (count / total) * 100
-                print(f"  {label}: {count}人 ({percentage:.1f}%)")
+    def import_students(self):
+        """从 CSV / JSON-lines 文件批量导入学生"""
+        print("\n" + "=" * 40)
+        print("导入学生")
+        print("=" * 40)
+
+        path = input("文件路径 (.csv / .jsonl): ").strip()
+        if not path:
+            print("文件路径不能为空")
+            return
+
+        try:
+            result = import_file(self.db, path, progress=console_progress)
+        except Exception as e:
+            print(f"\n❌ 导入失败: {e}")
+            print("已提交的部分会保留，再次导入同一文件时从断点继续")
+            return
+
+        if self.roster:
+            self.roster.sync()
+        print()
+        if result['resumed_from']:
+            print(f"从第{result['resumed_from'] + 1}行继续导入")
+        print(f"✅ 导入{result['imported']}名学生，用时{result['seconds']:.1f}秒")
+        if result['rejected']:
+            print(f"⚠️ 跳过{result['rejected']}行缺少姓名的数据，行号: {result['rejected_rows']}")
+
+    def export_students(self):
+        """把全部学生导出到 CSV / JSON-lines 文件"""
+        print("\n" + "=" * 40)
+        print("导出学生")
+        print("=" * 40)
+
+        path = input("文件路径 (.csv / .jsonl): ").strip()
+        if not path:
+            print("文件路径不能为空")
+            return
+
+        try:
+            count = export_file(self.db, path, progress=console_progress)
+        except Exception as e:
+            print(f"\n❌ 导出失败: {e}")
+            return
+
+        print(f"\n✅ 导出{count}名学生到 {path}")
 
     def run(self):
         """运行学生管理系统"""
@@ -291,10 +407,16 @@ class StudentManager:
             print("4. 更新学生信息")
             print("5. 删除学生")
             print("6. 统计信息")
-            print("7. 退出系统")
+            print("7. 导入学生")
+            print("8. 导出学生")
+            print("9. 退出系统")
             print("-" * 40)
 
-            choice = input("请选择操作 (1-7): ").strip()
+            choice = input("请选择操作 (1-9): ").strip()
+
+            # 其他操作之前先写完队列中的学生，保证能查到刚添加的数据
+            if self.buffer and choice != '1':
+                self.buffer.flush()
 
             if choice == '1':
                 self.add_student()
@@ -309,7 +431,13 @@ class StudentManager:
             elif choice == '6':
                 self.show_statistics()
             elif choice == '7':
+                self.import_students()
+            elif choice == '8':
+                self.export_students()
+            elif choice == '9':
                 print("谢谢使用，再见！")
+                if self.buffer:
+                    self.buffer.close()
                 if self.db:
                     self.db.close()
                 break
@@ -0,0 +1,107 @@
+from collections import namedtuple
+from functools import lru_cache
+
+from pymysql import converters
+from pymysql.constants import FIELD_TYPE
+
+
+STUDENT_FIELDS = ('student_id', 'name', 'height', 'created_at')
+
+
+@lru_cache(maxsize=256)
+def column_names(description):
+    # 同一种查询的 cursor.description 完全相同，列名元组只需要生成一次
+    return tuple(desc[0] for desc in description)
+
+
+@lru_cache(maxsize=256)
+def named_rows(columns):
+    """按列名生成 namedtuple 行类型，返回把原始元组转换成该类型的函数"""
+    return namedtuple('Row', columns, rename=True)._make
+
+
+def lazy_decoders():
+    """DECIMAL / DATETIME / TIMESTAMP 列保持字符串，等第一次访问时再转换
+
+    作为 pymysql 的 conv 参数使用，大结果集里没有被读取的值不再付出转换成本。
+    """
+    decoders = dict(converters.decoders)
+    for field_type in (FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL,
+                       FIELD_TYPE.DATETIME, FIELD_TYPE.TIMESTAMP):
+        decoders[field_type] = converters.through
+    return decoders
+
+
+class Student:
+    """一名学生的记录，按位置取值时与原来的 (学号, 姓名, 身高, 创建时间) 元组兼容"""
+
+    __slots__ = ('student_id', 'name', '_height', '_created_at')
+
+    def __init__(self, student_id=None, name=None, height=None, created_at=None):
+        self.student_id = student_id
+        self.name = name
+        self._height = height
+        self._created_at = created_at
+
+    @property
+    def height(self):
+        # Decimal 或未解码的字符串在第一次读取时转换成 float 并保存
+        value = self._height
+        if value is not None and not isinstance(value, float):
+            value = self._height = float(value)
+        return value
+
+    @height.setter
+    def height(self, value):
+        self._height = value
+
+    @property
+    def created_at(self):
+        value = self._created_at
+        if isinstance(value, str):
+            value = self._created_at = converters.convert_datetime(value)
+        return value
+
+    @created_at.setter
+    def created_at(self, value):
+        self._created_at = value
+
+    def __len__(self):
+        return len(STUDENT_FIELDS)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(getattr(self, field) for field in STUDENT_FIELDS[index])
+        return getattr(self, STUDENT_FIELDS[index])
+
+    def __iter__(self):
+        return (getattr(self, field) for field in STUDENT_FIELDS)
+
+    def __eq__(self, other):
+        if isinstance(other, Student):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return (f"Student(student_id={self.student_id!r}, name={self.name!r}, "
+                f"height={self.height!r}, created_at={self.created_at!r})")
+
+    def to_dict(self):
+        return dict(zip(STUDENT_FIELDS, self))
+
+    @classmethod
+    def from_columns(cls, columns):
+        """返回把该列顺序的原始行转换成 Student 的函数，可作为 helper 的 row_factory"""
+        return _student_maker(cls, tuple(columns))
+
+
+@lru_cache(maxsize=256)
+def _student_maker(cls, columns):
+    if columns[:len(STUDENT_FIELDS)] == STUDENT_FIELDS:
+        width = len(STUDENT_FIELDS)
+        if len(columns) == width:
+            return lambda row: cls(*row)
+        return lambda row: cls(*row[:width])
+
+    positions = [columns.index(field) if field in columns else None for field in STUDENT_FIELDS]
+    return lambda row: cls(*[None if i is None else row[i] for i in positions])
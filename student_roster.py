@@ -0,0 +1,322 @@
+import datetime
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+from pymysql import converters
+
+from height_index import HeightIndex
+from query_cache import is_read, write_table
+from student_records import Student
+from student_statistics import DEFAULT_PERCENTILES, StatisticsEngine
+
+
+# 没有 SQL 文本或者 SQL 中看不出表名的批量写操作，一律视为可能修改了花名册
+BULK_WRITES = ('insert_many', 'update_many', 'delete_many', 'upsert_many')
+
+
+def _timestamp(value):
+    # lazy_decode 模式下 TIMESTAMP 是未解码的字符串
+    if isinstance(value, str):
+        return converters.convert_datetime(value)
+    return value
+
+
+class StudentRoster:
+    """进程内的学生花名册，按学号、姓名和身高建立索引
+
+    load() 用流式查询读入全表；本进程的修改通过 apply_update / apply_delete 直接
+    更新索引，新增的学生由 sync() 读入。每隔 refresh_interval 秒，查询时会自动
+    sync()：读取 updated_at（没有该列时用 created_at）不早于上次同步位置的行，再用
+    COUNT(*) 检查其他进程是否删除了学生，对不上时重新 load()。
+
+    把 hook 注册到 helper 上后，经过该 helper 写入本表却没有 apply_* 的修改会让
+    花名册立即过期。身高的人数统计由 HeightIndex 回答；sql_fallback=True 时过期的
+    花名册不先同步，身高查询直接查数据库。
+    """
+
+    def __init__(self, db, table='students', refresh_interval=30.0, overlap=5.0,
+                 batch_size=5000, sql_fallback=False):
+        self.db = db
+        self.table = table
+        self.refresh_interval = refresh_interval
+        # 事务中写入的行在提交时 updated_at 可能已经早于同步位置，往回多读一段时间
+        self.overlap = datetime.timedelta(seconds=overlap)
+        self.batch_size = batch_size
+        self.sql_fallback = sql_fallback
+
+        self._lock = threading.RLock()
+        self._by_id = {}
+        self._by_name = {}
+        self._names = []
+        self._heights = []
+        self.height_index = HeightIndex()
+        # hook 看到的、还没有对应 apply_* 的写操作数
+        self._unapplied = 0
+        self.watermark_column = None
+        self._watermark = None
+        self._synced = None
+        self.loads = 0
+        self.syncs = 0
+
+    # ---------- 索引维护 ----------
+
+    def _add(self, student):
+        # 先更新身高索引，出错时其他索引保持不变
+        self.height_index.add(student.height)
+        self._by_id[student.student_id] = student
+        ids = self._by_name.get(student.name)
+        if ids is None:
+            ids = self._by_name[student.name] = set()
+            insort(self._names, student.name)
+        ids.add(student.student_id)
+        if student.height is not None:
+            insort(self._heights, (student.height, student.student_id))
+
+    def _remove(self, student_id):
+        student = self._by_id.pop(student_id, None)
+        if student is None:
+            return None
+        ids = self._by_name[student.name]
+        ids.discard(student_id)
+        if not ids:
+            del self._by_name[student.name]
+            del self._names[bisect_left(self._names, student.name)]
+        if student.height is not None:
+            del self._heights[bisect_left(self._heights, (student.height, student_id))]
+            self.height_index.remove(student.height)
+        return student
+
+    def _put(self, student):
+        self._remove(student.student_id)
+        self._add(student)
+
+    def _advance(self, value):
+        value = _timestamp(value)
+        if value is not None and (self._watermark is None or value > self._watermark):
+            self._watermark = value
+
+    def _read(self, where=None, params=None):
+        # 逐批读取 (Student, 同步列的值)
+        with self.db.select_stream(self.table, where, params, 'student_id',
+                                   self.batch_size) as stream:
+            if stream.description is None:
+                raise Exception(f"读取{self.table}失败")
+            columns = stream.columns
+            if self.watermark_column is None:
+                self.watermark_column = 'updated_at' if 'updated_at' in columns else 'created_at'
+            position = columns.index(self.watermark_column)
+            make = Student.from_columns(columns)
+            for batch in stream:
+                for row in batch:
+                    yield make(row), row[position]
+
+    # ---------- 同步 ----------
+
+    def load(self):
+        """重新读入全表，返回学生人数；读取失败时保留原来的索引"""
+        with self._lock:
+            self.watermark_column = None
+            students = []
+            watermark = None
+            for student, changed in self._read():
+                students.append(student)
+                changed = _timestamp(changed)
+                if changed is not None and (watermark is None or changed > watermark):
+                    watermark = changed
+
+            # 一次排序代替逐行 insort
+            by_name = {}
+            for student in students:
+                by_name.setdefault(student.name, set()).add(student.student_id)
+            self._by_id = {student.student_id: student for student in students}
+            self._by_name = by_name
+            self._names = sorted(by_name)
+            self._heights = sorted((s.height, s.student_id) for s in students
+                                   if s.height is not None)
+            self.height_index = HeightIndex.from_values(s.height for s in students)
+            self._watermark = watermark
+
+            self._unapplied = 0
+            self._synced = time.monotonic()
+            self.loads += 1
+            return len(self._by_id)
+
+    def sync(self):
+        """读入上次同步之后新增或修改的行，返回读入的行数"""
+        with self._lock:
+            if self._synced is None or self._watermark is None:
+                self.load()
+                return len(self._by_id)
+
+            since = self._watermark - self.overlap
+            changed = 0
+            for student, value in self._read(f"{self.watermark_column} >= %s", (since,)):
+                self._put(student)
+                self._advance(value)
+                changed += 1
+
+            # 删除不会留下修改时间，人数对不上说明其他进程删除过学生
+            if self.db.count(self.table) != len(self._by_id):
+                self.load()
+            self._unapplied = 0
+            self._synced = time.monotonic()
+            self.syncs += 1
+            return changed
+
+    def maybe_sync(self):
+        if self._synced is None:
+            self.load()
+        elif self.stale:
+            self.sync()
+
+    @property
+    def stale(self):
+        return (self._synced is None or self._unapplied > 0 or
+                time.monotonic() - self._synced >= self.refresh_interval)
+
+    def _local(self):
+        # 返回是否由内存索引回答；过期时 sql_fallback 查询数据库，否则先同步
+        if self.sql_fallback and self._synced is not None and self.stale:
+            return False
+        self.maybe_sync()
+        return True
+
+    def hook(self, event):
+        """作为 MySQLHelper 的 hook 使用，发现经过该 helper 对本表的写入"""
+        if event.error is not None:
+            return
+        if event.sql is not None:
+            if is_read(event.sql) or write_table(event.sql) not in (self.table, None):
+                return
+        elif event.operation not in BULK_WRITES:
+            return
+        with self._lock:
+            self._unapplied += 1
+
+    def _applied(self):
+        if self._unapplied:
+            self._unapplied -= 1
+
+    def apply_update(self, student_id, data):
+        """把本进程对一名学生的修改写进索引，每次 update 成功后调用一次"""
+        with self._lock:
+            self._applied()
+            student = self._by_id.get(student_id)
+            if student is None:
+                return
+            updated = Student(student.student_id, data.get('name', student.name),
+                              data.get('height', student.height), student.created_at)
+            self._put(updated)
+
+    def apply_delete(self, ids):
+        """每次 delete / delete_many 成功后调用一次"""
+        with self._lock:
+            self._applied()
+            for student_id in ids:
+                self._remove(student_id)
+
+    # ---------- 查询 ----------
+
+    def get(self, student_id):
+        self.maybe_sync()
+        return self._by_id.get(student_id)
+
+    def students(self):
+        """按学号排序的全部学生"""
+        self.maybe_sync()
+        with self._lock:
+            return [self._by_id[i] for i in sorted(self._by_id)]
+
+    def iter_pages(self, page_size=50):
+        # 与 MySQLHelper.iter_pages 的页结构相同，最后一页的 next_token 为 None
+        students = self.students()
+        for start in range(0, len(students), page_size):
+            page = students[start:start + page_size]
+            more = start + page_size < len(students)
+            yield {'data': page, 'count': len(page),
+                   'next_token': page[-1].student_id if more else None}
+
+    def _by_ids(self, ids):
+        return sorted((self._by_id[i] for i in ids), key=lambda s: s.student_id)
+
+    def find_name(self, name):
+        """姓名完全相同的学生"""
+        self.maybe_sync()
+        with self._lock:
+            return self._by_ids(self._by_name.get(name, ()))
+
+    def search_prefix(self, prefix):
+        self.maybe_sync()
+        with self._lock:
+            start = bisect_left(self._names, prefix)
+            ids = []
+            for name in self._names[start:]:
+                if not name.startswith(prefix):
+                    break
+                ids.extend(self._by_name[name])
+            return self._by_ids(ids)
+
+    def search(self, keyword):
+        """姓名包含关键词的学生，只扫描不同的姓名"""
+        self.maybe_sync()
+        with self._lock:
+            ids = [i for name in self._names if keyword in name for i in self._by_name[name]]
+            return self._by_ids(ids)
+
+    def height_between(self, min_height, max_height):
+        """身高在 [min_height, max_height] 之间的学生，按身高排序"""
+        if not self._local():
+            return self._select("height BETWEEN %s AND %s", (min_height, max_height))
+        with self._lock:
+            start = bisect_left(self._heights, (min_height,))
+            end = bisect_right(self._heights, (max_height, float('inf')))
+            return [self._by_id[i] for _, i in self._heights[start:end]]
+
+    def height_above(self, height):
+        """身高大于 height 的学生，按身高排序"""
+        if not self._local():
+            return self._select("height > %s", (height,))
+        with self._lock:
+            start = bisect_right(self._heights, (height, float('inf')))
+            return [self._by_id[i] for _, i in self._heights[start:]]
+
+    def _select(self, where, params):
+        return self.db.select(self.table, where, params, order_by='height',
+                              row_factory=Student.from_columns)['data']
+
+    def count_between(self, min_height, max_height):
+        if not self._local():
+            return self.db.count(self.table, "height BETWEEN %s AND %s", (min_height, max_height))
+        with self._lock:
+            return self.height_index.count_between(min_height, max_height)
+
+    def count_above(self, height):
+        if not self._local():
+            return self.db.count(self.table, "height > %s", (height,))
+        with self._lock:
+            return self.height_index.count_above(height)
+
+    def band_counts(self, ranges=None):
+        if not self._local():
+            return StatisticsEngine(self.db, self.table, ranges=ranges).compute().buckets
+        with self._lock:
+            return self.height_index.band_counts(ranges)
+
+    def statistics(self, ranges=None, percentiles=DEFAULT_PERCENTILES):
+        # 人数、均值、最值、百分位和分布都由 HeightIndex 以 O(log n) 得出
+        if not self._local():
+            return StatisticsEngine(self.db, self.table, ranges=ranges,
+                                    percentiles=percentiles).compute()
+        with self._lock:
+            return self.height_index.statistics(len(self._by_id), ranges, percentiles)
+
+    def stats(self):
+        return {
+            'students': len(self._by_id),
+            'names': len(self._names),
+            'watermark': self._watermark,
+            'loads': self.loads,
+            'syncs': self.syncs,
+            'stale': self.stale
+        }
@@ -0,0 +1,178 @@
+from name_search import NameSearch
+
+
+def column_exists(db, table, column):
+    result = db.get_data(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column))
+    return bool(result['data'] and result['data'][0][0])
+
+
+def add_column(column, definition):
+    def step(db, table):
+        if not column_exists(db, table, column):
+            db.run_sql(f"ALTER TABLE {table} ADD COLUMN {column} {definition}",
+                       raise_errors=True)
+    step.__name__ = f"add_column({column})"
+    return step
+
+
+# 早期的建表语句没有 created_at 列
+_add_created_at = add_column('created_at', "TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+
+
+def index_exists(db, table, index_name):
+    result = db.get_data(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (table, index_name))
+    return bool(result['data'] and result['data'][0][0])
+
+
+def create_index(name, columns):
+    def step(db, table):
+        index_name = name.format(table=table)
+        if not index_exists(db, table, index_name):
+            db.run_sql(f"CREATE INDEX {index_name} ON {table} ({columns})", raise_errors=True)
+    step.__name__ = f"create_index({name})"
+    return step
+
+
+def _add_name_fulltext(db, table):
+    return NameSearch(db, table, index_name=f"ft_{table}_name").ensure_index()
+
+
+# (版本号, 说明, 步骤, 是否可选)
+# 步骤是带 {table} 占位符的 SQL，或者 func(db, table)；可选迁移失败时不记录版本，下次再试
+MIGRATIONS = [
+    (1, "创建学生表", [
+        """
+        CREATE TABLE IF NOT EXISTS {table} (
+            student_id INT PRIMARY KEY AUTO_INCREMENT,
+            name VARCHAR(50) NOT NULL,
+            height DECIMAL(5,2),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        _add_created_at
+    ], False),
+    (2, "添加身高、姓名、创建时间索引", [
+        create_index("idx_{table}_height", "height"),
+        create_index("idx_{table}_name", "name"),
+        create_index("idx_{table}_created_at", "created_at")
+    ], False),
+    (3, "添加姓名ngram全文索引", [_add_name_fulltext], True),
+    # 内存花名册按 updated_at 增量同步其他进程的修改
+    (4, "添加修改时间列及索引", [
+        add_column('updated_at',
+                   "TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+        create_index("idx_{table}_updated_at", "updated_at")
+    ], False)
+]
+
+# 常用查询及其应该用到的索引，用于 EXPLAIN 检查
+STANDARD_QUERIES = [
+    ("身高范围", "SELECT * FROM {table} WHERE height BETWEEN %s AND %s", (160, 170),
+     'idx_{table}_height'),
+    ("身高下限", "SELECT * FROM {table} WHERE height > %s", (190,), 'idx_{table}_height'),
+    ("按身高降序", "SELECT * FROM {table} ORDER BY height DESC LIMIT 10", None,
+     'idx_{table}_height'),
+    ("姓名等值", "SELECT * FROM {table} WHERE name = %s", ('张翼德',), 'idx_{table}_name'),
+    ("姓名前缀", "SELECT * FROM {table} WHERE name LIKE %s", ('张%',), 'idx_{table}_name'),
+    ("最近添加", "SELECT * FROM {table} WHERE created_at >= %s", ('2100-01-01',),
+     'idx_{table}_created_at')
+]
+
+
+def ensure_migrations_table(db):
+    db.run_sql("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            table_name VARCHAR(64) NOT NULL,
+            version INT NOT NULL,
+            description VARCHAR(255),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, version)
+        )
+    """, raise_errors=True)
+
+
+def table_exists(db, table):
+    result = db.get_data(
+        "SELECT COUNT(*) FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table,))
+    return bool(result['data'] and result['data'][0][0])
+
+
+def applied_versions(db, table):
+    result = db.get_data("SELECT version FROM schema_migrations WHERE table_name = %s", (table,))
+    return {row[0] for row in result['data']}
+
+
+def migrate(db, table='students'):
+    """把表结构升级到最新版本，返回是否成功"""
+    try:
+        ensure_migrations_table(db)
+        # 表被删掉后旧的版本记录就失效了
+        if not table_exists(db, table):
+            db.run_sql("DELETE FROM schema_migrations WHERE table_name = %s", (table,),
+                       raise_errors=True)
+        applied = applied_versions(db, table)
+    except Exception as e:
+        print(f"✗ 读取迁移记录失败: {e}")
+        return False
+
+    for version, description, steps, optional in MIGRATIONS:
+        if version in applied:
+            continue
+
+        try:
+            for step in steps:
+                if callable(step):
+                    if step(db, table) is False:
+                        raise Exception(f"{step.__name__} 未完成")
+                else:
+                    db.run_sql(step.format(table=table), raise_errors=True)
+        except Exception as e:
+            if optional:
+                print(f"⚠️ 可选迁移 {version}（{description}）未完成: {e}")
+                continue
+            print(f"✗ 迁移 {version}（{description}）失败: {e}")
+            return False
+
+        db.run_sql("INSERT INTO schema_migrations (table_name, version, description) "
+                   "VALUES (%s, %s, %s)", (table, version, description))
+
+    return True
+
+
+def explain(db, sql, params=None):
+    result = db.get_data("EXPLAIN " + sql, params)
+    return [dict(zip(result['columns'], row)) for row in result['data']]
+
+
+def index_report(db, table='students'):
+    """用 EXPLAIN 检查常用查询是否用上了预期的索引"""
+    existing = {row[2] for row in db.get_data(f"SHOW INDEX FROM {table}")['data']}
+    report = []
+
+    for label, sql, params, index in STANDARD_QUERIES:
+        index = index.format(table=table)
+        plan = explain(db, sql.format(table=table), params)
+        key = plan[0].get('key') if plan else None
+        report.append({
+            'query': label,
+            'expected_index': index,
+            'index_exists': index in existing,
+            'used_index': key,
+            'access_type': plan[0].get('type') if plan else None,
+            'rows': plan[0].get('rows') if plan else None,
+            'missing': index not in existing,
+            'uses_index': key is not None and index in str(key).split(',')
+        })
+
+    return report
+
+
+def missing_indexes(db, table='students'):
+    return sorted({item['expected_index'] for item in index_report(db, table) if item['missing']})
@@ -0,0 +1,145 @@
+from bisect import bisect_left
+from collections import Counter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+DEFAULT_HEIGHT_RANGES = [
+    (0, 160, "160cm以下"),
+    (160, 170, "160-170cm"),
+    (170, 180, "170-180cm"),
+    (180, 300, "180cm以上")
+]
+
+DEFAULT_PERCENTILES = (25, 50, 75, 90)
+
+
+class StatisticsResult:
+    """统计结果"""
+
+    def __init__(self, total, counted, mean, min_value, max_value, buckets, percentiles):
+        self.total = total
+        self.counted = counted
+        self.mean = mean
+        self.min = min_value
+        self.max = max_value
+        self.buckets = buckets
+        self.percentiles = percentiles
+
+    def percentage(self, count):
+        return count / self.total * 100 if self.total else 0.0
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'counted': self.counted,
+            'mean': self.mean,
+            'min': self.min,
+            'max': self.max,
+            'buckets': [dict(bucket, percentage=self.percentage(bucket['count']))
+                        for bucket in self.buckets],
+            'percentiles': {str(p): value for p, value in self.percentiles.items()}
+        }
+
+
+def _percentile(values, counts, counted, p):
+    # 与 PERCENTILE_CONT 相同的线性插值
+    rank = p / 100 * (counted - 1)
+    lower = int(rank)
+    upper = min(lower + 1, counted - 1)
+
+    lower_value = upper_value = None
+    seen = 0
+    for value, count in zip(values, counts):
+        seen += count
+        if lower_value is None and seen > lower:
+            lower_value = value
+        if seen > upper:
+            upper_value = value
+            break
+
+    return lower_value + (upper_value - lower_value) * (rank - lower)
+
+
+def compute_statistics(distribution, ranges=None, percentiles=DEFAULT_PERCENTILES):
+    """根据 (值, 人数) 分布计算统计结果，值为 None 的行只计入总人数"""
+    ranges = DEFAULT_HEIGHT_RANGES if ranges is None else ranges
+
+    total = 0
+    merged = {}
+    for value, count in distribution:
+        total += count
+        if value is not None:
+            value = float(value)
+            merged[value] = merged.get(value, 0) + count
+
+    values = sorted(merged)
+    counts = [merged[v] for v in values]
+    counted = sum(counts)
+
+    buckets = []
+    for min_v, max_v, label in ranges:
+        count = sum(counts[bisect_left(values, min_v):bisect_left(values, max_v)])
+        buckets.append({'label': label, 'min': min_v, 'max': max_v, 'count': count})
+
+    if not counted:
+        return StatisticsResult(total, 0, None, None, None, buckets, {})
+
+    mean = sum(v * c for v, c in zip(values, counts)) / counted
+    result_percentiles = {p: _percentile(values, counts, counted, p) for p in percentiles}
+
+    return StatisticsResult(total, counted, mean, values[0], values[-1],
+                            buckets, result_percentiles)
+
+
+def statistics_from_values(values, ranges=None, percentiles=DEFAULT_PERCENTILES):
+    """根据已经取回的一列值（例如 get_columns 的身高数组）计算统计结果，NULL/NaN 只计入总人数"""
+    ranges = DEFAULT_HEIGHT_RANGES if ranges is None else ranges
+
+    if numpy is None:
+        distribution = Counter(None if v is None or v != v else v for v in values)
+        return compute_statistics(distribution.items(), ranges, percentiles)
+
+    data = numpy.asarray(values, dtype='float64')
+    total = len(data)
+    data = numpy.sort(data[~numpy.isnan(data)])
+
+    buckets = []
+    for min_v, max_v, label in ranges:
+        count = int(numpy.searchsorted(data, max_v) - numpy.searchsorted(data, min_v))
+        buckets.append({'label': label, 'min': min_v, 'max': max_v, 'count': count})
+
+    if not data.size:
+        return StatisticsResult(total, 0, None, None, None, buckets, {})
+
+    # numpy 默认的线性插值与 PERCENTILE_CONT 一致
+    values_at = numpy.percentile(data, list(percentiles)) if percentiles else []
+    return StatisticsResult(total, int(data.size), float(data.mean()), float(data[0]),
+                            float(data[-1]), buckets,
+                            {p: float(v) for p, v in zip(percentiles, values_at)})
+
+
+class StatisticsEngine:
+    """一次查询完成总数、平均值、最值、分布和百分位统计"""
+
+    def __init__(self, db, table='students', column='height', ranges=None,
+                 percentiles=DEFAULT_PERCENTILES):
+        self.db = db
+        self.table = table
+        self.column = column
+        self.ranges = DEFAULT_HEIGHT_RANGES if ranges is None else ranges
+        self.percentiles = percentiles
+
+    def compute(self, where=None, params=None):
+        # 按值分组只返回不同身高的个数（DECIMAL(5,2) 最多几万个），
+        # 所有指标都在本地由这一份分布算出
+        sql = f"SELECT {self.column}, COUNT(*) FROM {self.table}"
+        if where:
+            sql += f" WHERE {where}"
+        sql += f" GROUP BY {self.column}"
+
+        result = self.db.get_data(sql, params)
+        return compute_statistics(result['data'], self.ranges, self.percentiles)
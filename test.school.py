@@ -1,3 +1,4 @@
+from db_config import load_config
 from mysql_helper import MySQLHelper
 
 
@@ -6,12 +7,7 @@ def test_school_system():
     print("学校学生管理系统测试")
     print("=" * 60)
 
-    db = MySQLHelper(
-        host='localhost',
-        user='root',
-        password='123456',
-        database='school_db'
-    )
+    db = MySQLHelper(**load_config())
 
     if not db.connect():
         print("连接失败")
@@ -136,28 +132,25 @@ def show_students(result):
 def check_database():
     print("检查数据库状态...")
 
-    db = MySQLHelper(
-        host='localhost',
-        user='root',
-        password='123456'
-    )
+    config = load_config()
+    db = MySQLHelper(config['host'], config['user'], config['password'])
 
     try:
         import pymysql
         conn = pymysql.connect(
-            host='localhost',
-            user='root',
-            password='123456',
+            host=config['host'],
+            user=config['user'],
+            password=config['password'],
             charset='utf8mb4'
         )
 
         cursor = conn.cursor()
 
-        cursor.execute("SHOW DATABASES LIKE 'school_db'")
+        cursor.execute("SHOW DATABASES LIKE %s", (config['database'],))
         if cursor.fetchone():
-            print("数据库 school_db 存在")
+            print(f"数据库 {config['database']} 存在")
 
-            cursor.execute("USE school_db")
+            cursor.execute(f"USE `{config['database']}`")
 
             cursor.execute("SHOW TABLES LIKE 'students'")
             if cursor.fetchone():
@@ -171,7 +164,7 @@ def check_database():
             else:
                 print("表 students 不存在")
         else:
-            print("数据库 school_db 不存在")
+            print(f"数据库 {config['database']} 不存在")
 
         cursor.close()
         conn.close()
@@ -183,27 +176,24 @@ def check_database():
 def create_database_and_table():
     print("创建数据库和表...")
 
-    db = MySQLHelper(
-        host='localhost',
-        user='root',
-        password='123456'
-    )
+    config = load_config()
+    db = MySQLHelper(config['host'], config['user'], config['password'])
 
     try:
         import pymysql
         conn = pymysql.connect(
-            host='localhost',
-            user='root',
-            password='123456',
+            host=config['host'],
+            user=config['user'],
+            password=config['password'],
             charset='utf8mb4'
         )
 
         cursor = conn.cursor()
 
-        cursor.execute("CREATE DATABASE IF NOT EXISTS school_db")
-        print("数据库 school_db 创建成功")
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{config['database']}`")
+        print(f"数据库 {config['database']} 创建成功")
 
-        cursor.execute("USE school_db")
+        cursor.execute(f"USE `{config['database']}`")
 
         create_table_sql = """
                            CREATE TABLE IF NOT EXISTS students \
@@ -0,0 +1,168 @@
+import atexit
+import threading
+import time
+
+from mysql_helper import MySQLHelper, insert_sql
+
+
+def print_error(row, error):
+    print(f"✗ 写缓冲插入失败: {error}，数据: {row}")
+
+
+class WriteBuffer:
+    """写缓冲：insert() 只把行放进内存队列立即返回，由后台线程批量写入
+
+    队列达到 max_rows 行、最早的一行等待超过 max_delay 秒或者调用 flush() 时写入
+    一批。每批在一个事务里用 insert_many 写入，整批失败时逐行重试，仍然失败的行
+    交给 on_error(row, error)。排队的行超过 max_pending 时 insert() 等待后台线程
+    追上。close() 写完队列中所有的行后才返回，进程正常退出时会自动 close。
+    """
+
+    def __init__(self, db, table='students', max_rows=1000, max_delay=1.0, max_pending=100000,
+                 chunk_size=1000, on_error=print_error, hooks=None):
+        if max_rows < 1:
+            raise ValueError("max_rows必须大于0")
+
+        self.table = table
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self.on_error = on_error
+
+        # 后台线程使用自己的 helper：连接池模式下共用同一个池，否则单独建一个连接，
+        # 不和调用方抢同一个连接；共用查询缓存，写入后缓存照常失效
+        self.writer = MySQLHelper(db.host, db.user, db.password, db.database, pool=db.pool,
+                                  cache=db.cache, hooks=[] if hooks is None else hooks)
+        if not self.writer.connect():
+            raise Exception("写缓冲连接数据库失败")
+
+        self._cond = threading.Condition()
+        self._rows = []
+        self._oldest = None
+        self._closed = False
+        self._added = 0
+        self._done = 0
+        self._flush_target = 0
+
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+        self._thread = threading.Thread(target=self._run, name=f"write-buffer-{table}",
+                                        daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def insert(self, data):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("写缓冲已关闭")
+            while self.max_pending and len(self._rows) >= self.max_pending:
+                self._cond.wait()
+            self._rows.append(dict(data))
+            self._added += 1
+            # 第一行到达时后台线程开始计时，满一批时立即写入
+            if len(self._rows) == 1:
+                self._oldest = time.monotonic()
+                self._cond.notify_all()
+            elif len(self._rows) >= self.max_rows:
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """写入调用之前加入的所有行，返回是否在 timeout 秒内完成"""
+        with self._cond:
+            target = self._added
+            self._flush_target = max(self._flush_target, target)
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._done >= target, timeout)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        atexit.unregister(self.close)
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': self._added - self._done,
+                'added': self._added,
+                'written': self.written,
+                'failed': self.failed,
+                'batches': self.batches
+            }
+
+    def _ready(self):
+        # 返回 (是否写入一批, 需要等待的秒数)
+        if not self._rows:
+            return False, None
+        if (self._closed or len(self._rows) >= self.max_rows or
+                self._flush_target > self._done):
+            return True, None
+        remaining = self._oldest + self.max_delay - time.monotonic()
+        return remaining <= 0, remaining
+
+    def _run(self):
+        while True:
+            with self._cond:
+                ready, timeout = self._ready()
+                while not ready:
+                    if self._closed and not self._rows:
+                        return
+                    self._cond.wait(timeout)
+                    ready, timeout = self._ready()
+                # 每批最多 max_rows 行，剩下的行保留原来的等待起点，会紧接着写入
+                batch = self._rows[:self.max_rows]
+                del self._rows[:self.max_rows]
+                # 唤醒因为队列满而等待的 insert()
+                self._cond.notify_all()
+
+            try:
+                self._write(batch)
+            finally:
+                with self._cond:
+                    self._done += len(batch)
+                    self._cond.notify_all()
+
+    def _write(self, batch):
+        # insert_many 要求同一批的列相同，按列分组
+        groups = {}
+        for row in batch:
+            groups.setdefault(tuple(row), []).append(row)
+
+        for columns, rows in groups.items():
+            try:
+                with self.writer.transaction():
+                    self.writer.insert_many(self.table, rows, self.chunk_size)
+                self.written += len(rows)
+            except Exception:
+                # 整批已经回滚，逐行写入找出出错的行
+                sql = insert_sql(self.table, columns)
+                for row in rows:
+                    try:
+                        self.writer.run_sql(sql, tuple(row.values()), raise_errors=True)
+                        self.written += 1
+                    except Exception as e:
+                        self.failed += 1
+                        self._report(row, e)
+        self.batches += 1
+
+    def _report(self, row, error):
+        if self.on_error is None:
+            return
+        try:
+            self.on_error(row, error)
+        except Exception as e:
+            # 回调出错不能让后台线程退出，否则后面的行都不会再写入
+            print(f"✗ 写缓冲错误回调失败: {e}")